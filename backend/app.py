@@ -1,154 +1,313 @@
+import json
 import sqlite3
-import pandas as pd
-import ast
-from flask import Flask, jsonify, request
+from datetime import date, timedelta
+from types import SimpleNamespace
+import numpy as np
+from flask import Blueprint, Flask, current_app, jsonify, request
 from flask_cors import CORS
 
+from cache import ResponseCache, cached_response
+from comment_store import LABELS, CommentStore
+from comments import build_query, day_after, page_from_rows, parse_filters
+from config import Config
+from db import ConnectionPool
+from engagement_stats import columns_from_rows, summarize
+from prefix_index import AggregatesIndex, db_stamp
+from resample import GRANULARITIES, resample
+
 # --- Configuración ---
-DB_PATH = '../data/databaser.db'
+# (la configuración de despliegue vive en config.py y se lee del entorno)
 AGGREGATES_TABLE = 'aggregates'
 EVENTS_TABLE = 'events'
-TABLA_TEMAS = 'datos_finales_con_temas'
+EVENT_IMPACT_TABLE = 'event_impact'  # scripts/event_impact.py
+ANOMALIES_TABLE = 'sentiment_anomalies'  # scripts/anomalies.py
+MAX_BATCH_WINDOWS = 100
+MAX_BATCH_DAYS = 3650     # ventanas de /kpis/batch de hasta 10 años
+TOPICS_ROLLUP_TABLE = 'topic_daily'  # tema × sentimiento × día (scripts/rollups.py)
+TOPIC_THRESHOLD = 0.30               # mismo umbral que scripts/pipeline_db.py
+SENTIMENT_MODEL = 'cardiffnlp/twitter-roberta-base-sentiment-latest'  # ídem
 
-app = Flask(__name__)
-CORS(app)
+api = Blueprint('api', __name__)
 
-def get_db_connection():
-    """Crea una conexión a la base de datos."""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        # Cambiamos a None para que Pandas lea la DB
-        conn.row_factory = None 
-        return conn
-    except Exception as e:
-        print(f"Error al conectar a DB: {e}")
+
+def create_app(config=None):
+    """
+    Crea la app de Flask con su pool de conexiones, caché, índice de agregados
+    y (con COMMENT_STORE) almacén de comentarios en memoria. Con PRELOAD ambos
+    se cargan aquí; bajo gunicorn --preload eso ocurre en el proceso maestro,
+    antes del fork, y los workers comparten esos arrays. Si falta una tabla
+    (DB recién creada, sin scripts/aggregates.py) la app arranca igual y la
+    carga queda para la primera consulta.
+    """
+    config = config or Config()
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    CORS(app)
+
+    app.extensions['ye_api'] = SimpleNamespace(
+        pool=ConnectionPool(config.DB_PATH, size=config.POOL_SIZE),
+        index=AggregatesIndex(AGGREGATES_TABLE),
+        cache=ResponseCache(config.CACHE_MAX_ENTRIES, config.CACHE_TTL_SECONDS),
+        comments=CommentStore(SENTIMENT_MODEL) if config.COMMENT_STORE else None,
+    )
+    app.register_blueprint(api)
+
+    if config.PRELOAD:
+        with app.app_context():
+            for load in (get_aggregates_index, get_comment_store):
+                try:
+                    load()
+                except sqlite3.OperationalError as e:
+                    print(f"Precarga omitida ({load.__name__}): {e}; se cargará en la primera consulta")
+        # No se heredan conexiones abiertas a través del fork
+        app.extensions['ye_api'].pool.close_all()
+
+    return app
+
+
+def get_state():
+    """Pool, índice y caché de la app actual."""
+    return current_app.extensions['ye_api']
+
+
+def db_connection():
+    """
+    Presta una conexión de sólo lectura del pool (filas como sqlite3.Row).
+    Usar siempre con 'with': la conexión vuelve al pool aunque haya error.
+    """
+    return get_state().pool.connection()
+
+
+def get_db_version():
+    """Sello de versión de la DB (mtime/tamaño de los archivos, sin SQL)."""
+    return db_stamp(get_state().pool.db_path)
+
+
+def cached(view):
+    """Cachea la respuesta del endpoint hasta que cambie la versión de la DB."""
+    return cached_response(lambda: get_state().cache, get_db_version)(view)
+
+
+def get_aggregates_index():
+    """Índice de sumas acumuladas, recargado sólo si la DB cambió."""
+    state = get_state()
+    return state.index.refresh_if_stale(state.pool.db_path, db_connection)
+
+
+def missing_aggregates(e):
+    """Respuesta 503 si 'e' es que todavía no existe la tabla de agregados; None si es otro error."""
+    if isinstance(e, sqlite3.OperationalError) and AGGREGATES_TABLE in str(e):
+        return jsonify({"error": "Falta la tabla aggregates (scripts/aggregates.py)"}), 503
+    return None
+
+
+@api.errorhandler(sqlite3.OperationalError)
+def handle_operational_error(e):
+    """Las rutas que leen el índice sin try propio (/series, ...) también dan 503."""
+    response = missing_aggregates(e)
+    if response is None:
+        print(f"Error de SQLite: {e}")
+        return jsonify({"error": "Datos no disponibles"}), 500
+    return response
+
+
+def get_comment_store():
+    """Almacén de comentarios en memoria (recargado si la DB cambió), o None si está desactivado."""
+    state = get_state()
+    if state.comments is None:
         return None
+    return state.comments.refresh_if_stale(state.pool.db_path, db_connection)
+
 
+def kpis_from_totals(totals):
+    """Formato de respuesta de /kpis a partir de los totales del índice."""
+    return {
+        "total_pos": totals["pos"],
+        "total_neg": totals["neg"],
+        "total_neu": totals["neu"],
+        "total_comments": totals["total"],
+    }
 
-@app.route('/topics')
+
+def get_resampled_series(default_granularity):
+    """
+    Lee from/to/source/granularity de la query y devuelve la serie del índice
+    re-muestreada: (inicios de bucket, {campo: sumas}), sólo buckets con datos.
+    """
+    from_date = request.args.get('from', '2020-10-24')
+    to_date = request.args.get('to', '2025-10-23')
+    source = request.args.get('source', 'all')
+    granularity = request.args.get('granularity', default_granularity)
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity debe ser una de {', '.join(GRANULARITIES)}")
+
+    days, values = get_aggregates_index().daily(from_date, to_date, source)
+    buckets, sums = resample(days, values, granularity)
+    keep = sums['total'] > 0
+    return buckets[keep], {f: v[keep] for f, v in sums.items()}
+
+
+@api.route('/topics')
+@cached
 def get_topics():
-    # ... (el resto de tu función /topics sin cambios) ...
-    # Asegurémonos de que la conexión vuelva a usar sqlite3.Row
-    # para que el resto de los endpoints funcionen.
-    conn = get_db_connection()
-    if conn: conn.row_factory = sqlite3.Row
-    else: return jsonify({"error": "Datos no disponibles"}), 500
-    
     from_date = request.args.get('from', '2020-10-24')
     to_date = request.args.get('to', '2025-10-23')
 
+    # Sumamos filas pre-agregadas por día: un range scan sobre la PK (bucket_date, ...)
     query = f"""
-        SELECT 
-            t.sentiment_label, t.tematicas
-        FROM {TABLA_TEMAS} AS t
-        INNER JOIN posts AS p ON t.post_id = p.post_id
-        WHERE date(p.created_at) BETWEEN ? AND ?
+        SELECT
+            topic,
+            sentiment_label,
+            SUM(total_posts) AS total
+        FROM {TOPICS_ROLLUP_TABLE}
+        WHERE bucket_date BETWEEN ? AND ?
+        GROUP BY topic, sentiment_label
     """
-    
+
     try:
-        df_datos_finales = pd.read_sql_query(query, conn, params=(from_date, to_date))
-        conn.close()
+        with db_connection() as conn:
+            rows = conn.execute(query, (from_date, to_date)).fetchall()
     except Exception as e:
-        print(f"Error al leer la tabla {TABLA_TEMAS}: {e}")
+        print(f"Error al leer la tabla {TOPICS_ROLLUP_TABLE}: {e}")
         return jsonify({"error": "Datos no disponibles"}), 500
 
-    if df_datos_finales.empty:
+    if not rows:
         return jsonify({"error": "La tabla de temas está vacía"}), 500
 
-    df_datos_finales['tematicas'] = df_datos_finales['tematicas'].apply(ast.literal_eval)
-    df_explotado = df_datos_finales.explode('tematicas')
-    df_agrupado = df_explotado.groupby(['tematicas', 'sentiment_label']).size()
-    
     resultado_json = {}
-    for (tema, sentimiento), count in df_agrupado.items():
+    for row in rows:
+        tema, sentimiento = row["topic"], row["sentiment_label"]
         if not tema:
             continue
         if tema not in resultado_json:
             resultado_json[tema] = {"pos": 0, "neg": 0, "neu": 0}
-        
-        if sentimiento == 'pos':
-            resultado_json[tema]['pos'] = int(count)
-        elif sentimiento == 'neg':
-            resultado_json[tema]['neg'] = int(count)
-        elif sentimiento == 'neu':
-            resultado_json[tema]['neu'] = int(count)
-            
+        if sentimiento in resultado_json[tema]:
+            resultado_json[tema][sentimiento] = int(row["total"])
+
     return jsonify(resultado_json)
 
 
-@app.route('/kpis')
+@api.route('/kpis')
+@cached
 def get_kpis():
-    # ... (tu endpoint /kpis sin cambios) ...
-    conn = get_db_connection()
-    if conn: conn.row_factory = sqlite3.Row
-    else: return jsonify({"error": "Datos no disponibles"}), 500
-
+    """
+    Totales pos/neg/neu de un rango. Se resuelve con el índice de sumas
+    acumuladas (agregados diarios), así que el costo no depende del largo del rango.
+    Opcional: ?source=youtube|reddit|all (por defecto 'all').
+    """
     from_date = request.args.get('from', '2020-10-24')
     to_date = request.args.get('to', '2025-10-23')
-    
-    query = f"""
-        SELECT 
-            SUM(pos) as total_pos, 
-            SUM(neg) as total_neg, 
-            SUM(neu) as total_neu, 
-            SUM(total_posts) as total_comments
-        FROM {AGGREGATES_TABLE}
-        WHERE bucket_date BETWEEN ? AND ?
-    """
-    
+    source = request.args.get('source', 'all')
+
     try:
-        cursor = conn.cursor()
-        row = cursor.execute(query, (from_date, to_date)).fetchone()
-        conn.close()
-        
-        return jsonify(dict(row) if row else {})
-        
+        totals = get_aggregates_index().range_totals(from_date, to_date, source)
+        return jsonify(kpis_from_totals(totals))
+
+    except ValueError:
+        return jsonify({"error": "Fechas inválidas (YYYY-MM-DD)"}), 400
     except Exception as e:
         print(f"Error en /kpis: {e}")
-        return jsonify({"error": str(e)}), 500
+        return missing_aggregates(e) or (jsonify({"error": str(e)}), 500)
 
-@app.route('/series')
-def get_series():
-    # ... (tu endpoint /series sin cambios) ...
-    conn = get_db_connection()
-    if conn: conn.row_factory = sqlite3.Row
-    else: return jsonify({"error": "Datos no disponibles"}), 500
+@api.route('/kpis/batch', methods=['POST'])
+def get_kpis_batch():
+    """
+    KPIs para varias ventanas de fechas en una sola llamada (panel de eventos).
+    Body JSON, una de estas dos formas:
+      {"windows": [{"key": "...", "from": "YYYY-MM-DD", "to": "YYYY-MM-DD"}, ...]}
+      {"events": ["YYYY-MM-DD", ...], "days": 30, "max_date": "YYYY-MM-DD"}
+    En la segunda, cada ventana es [evento, evento + days - 1]: 'days' días
+    contando el del evento, igual que event_impact. Devuelve los totales por ventana y la suma combinada de todas ellas.
+    """
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "El body debe ser un objeto JSON"}), 400
 
-    from_date = request.args.get('from', '2020-10-24')
-    to_date = request.args.get('to', '2025-10-23')
+    try:
+        windows = _parse_kpi_windows(body)
+    except (TypeError, ValueError, KeyError, OverflowError) as e:
+        return jsonify({"error": f"Ventanas inválidas: {e}"}), 400
+    if not windows:
+        return jsonify({"error": "Se requiere al menos una ventana"}), 400
+    if len(windows) > MAX_BATCH_WINDOWS:
+        return jsonify({"error": f"Máximo {MAX_BATCH_WINDOWS} ventanas por llamada"}), 400
+
+    source = body.get("source", "all")
+    if source not in ('youtube', 'reddit', 'all'):
+        return jsonify({"error": "source debe ser youtube, reddit o all"}), 400
 
-    query = f"""
-        SELECT 
-            bucket_date AS day, 
-            pos, 
-            neg, 
-            neu, 
-            total_posts AS total
-        FROM {AGGREGATES_TABLE}
-        WHERE granularity = 'day' 
-          AND bucket_date BETWEEN ? AND ?
-        ORDER BY bucket_date
+    try:
+        index = get_aggregates_index()
+    except Exception as e:
+        print(f"Error en /kpis/batch: {e}")
+        return missing_aggregates(e) or (jsonify({"error": str(e)}), 500)
+
+    # Cada ventana son dos lecturas sobre las sumas acumuladas
+    results = []
+    combined = {"total_pos": 0, "total_neg": 0, "total_neu": 0, "total_comments": 0}
+    for w in windows:
+        totals = kpis_from_totals(index.range_totals(w["from"], w["to"], source))
+        for k, v in totals.items():
+            combined[k] += v
+        results.append({"key": w["key"], "from": w["from"], "to": w["to"], **totals})
+
+    return jsonify({"windows": results, "combined": combined})
+
+
+def _parse_kpi_windows(body):
+    """Normaliza el body de /kpis/batch a una lista de {key, from, to} (fechas ISO)."""
+    if "windows" in body:
+        windows = []
+        for i, w in enumerate(body["windows"]):
+            if not isinstance(w, dict):
+                raise ValueError(f"la ventana {i} debe ser un objeto")
+            from_date = date.fromisoformat(w["from"]).isoformat()
+            to_date = date.fromisoformat(w["to"]).isoformat()
+            windows.append({"key": w.get("key", str(i)), "from": from_date, "to": to_date})
+        return windows
+
+    # Ventanas de N días desde cada evento (incluido), recortadas a max_date
+    days = int(body.get("days", 30))
+    if not 1 <= days <= MAX_BATCH_DAYS:
+        raise ValueError(f"days debe estar entre 1 y {MAX_BATCH_DAYS}")
+    max_date = date.fromisoformat(body.get("max_date", "2025-10-23"))
+    windows = []
+    for event_date in body.get("events", []):
+        start = date.fromisoformat(event_date)
+        end = min(start + timedelta(days=days - 1), max_date)
+        windows.append({"key": event_date, "from": start.isoformat(), "to": end.isoformat()})
+    return windows
+
+@api.route('/series')
+@cached
+def get_series():
+    """
+    Serie pos/neg/neu/total de un rango, leída del índice de agregados.
+    Opcional: ?granularity=day|week|month|quarter|semester|year (por defecto 'day')
+    y ?source=youtube|reddit|all (por defecto 'all'). 'day' es el inicio del bucket.
     """
-    
     try:
-        cursor = conn.cursor()
-        rows = cursor.execute(query, (from_date, to_date)).fetchall()
-        conn.close()
-        
-        data = [dict(row) for row in rows]
+        buckets, values = get_resampled_series('day')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        data = [
+            {"day": str(d), "pos": int(pos), "neg": int(neg), "neu": int(neu), "total": int(total)}
+            for d, pos, neg, neu, total in zip(
+                buckets, values["pos"], values["neg"], values["neu"], values["total"]
+            )
+        ]
         return jsonify(data)
         
     except Exception as e:
         print(f"Error en /series: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/events')
+@api.route('/events')
+@cached
 def get_events():
-    # ... (tu endpoint /events sin cambios) ...
-    conn = get_db_connection()
-    if conn: conn.row_factory = sqlite3.Row
-    else: return jsonify({"error": "Datos no disponibles"}), 500
-
     query = f"""
         SELECT 
             date AS event_date, 
@@ -158,9 +317,8 @@ def get_events():
     """
     
     try:
-        cursor = conn.cursor()
-        rows = cursor.execute(query).fetchall()
-        conn.close()
+        with db_connection() as conn:
+            rows = conn.execute(query).fetchall()
         
         data = [dict(row) for row in rows]
         return jsonify(data)
@@ -169,46 +327,165 @@ def get_events():
         print(f"Error en /events: {e}")
         return jsonify({"error": str(e)}), 500
 
+@api.route('/events/impact')
+@cached
+def get_event_impact():
+    """
+    Impacto precalculado de cada evento (tabla event_impact): totales y
+    sentimiento neto antes/después del evento por ventana de días, delta
+    contra la línea base previa, aumento de volumen y temas principales.
+    Opcional: ?source=youtube|reddit|all (por defecto 'all').
+    Devuelve una lista de eventos con {"windows": {"7": {...}, "30": {...}}}.
+    """
+    source = request.args.get('source', 'all')
+    if source not in ('youtube', 'reddit', 'all'):
+        return jsonify({"error": "source debe ser youtube, reddit o all"}), 400
+
+    sql = f"""
+        SELECT *
+        FROM {EVENT_IMPACT_TABLE}
+        WHERE source = ?
+        ORDER BY event_date, event_id, window_days
+    """
+    try:
+        with db_connection() as conn:
+            rows = conn.execute(sql, (source,)).fetchall()
+    except sqlite3.OperationalError as e:
+        if EVENT_IMPACT_TABLE in str(e):
+            return jsonify({"error": "Falta la tabla event_impact (scripts/event_impact.py)"}), 503
+        print(f"Error en /events/impact: {e}")
+        return jsonify({"error": "Datos no disponibles"}), 500
+    except Exception as e:
+        print(f"Error en /events/impact: {e}")
+        return jsonify({"error": "Datos no disponibles"}), 500
+
+    def side(row, prefix):
+        return {k: row[f"{prefix}_{k}"] for k in ('pos', 'neu', 'neg', 'total', 'net')}
+
+    events = {}
+    for row in rows:
+        event = events.setdefault(row["event_id"], {
+            "event_date": row["event_date"],
+            "title": row["title"],
+            "tag": row["tag"],
+            "windows": {},
+        })
+        event["windows"][str(row["window_days"])] = {
+            "before": side(row, 'before'),
+            "after": side(row, 'after'),
+            "baseline": {"total": row["baseline_total"], "days": row["baseline_days"],
+                         "net": row["baseline_net"]},
+            "delta_net": row["delta_net"],
+            "volume_lift": row["volume_lift"],
+            "top_topics": json.loads(row["top_topics"] or '[]'),
+        }
+    return jsonify(list(events.values()))
+
+@api.route('/anomalies')
+@cached
+def get_anomalies():
+    """
+    Días con proporción negativa o volumen anómalos (tabla sentiment_anomalies):
+    z-score contra la ventana de días previos, por fuente.
+    Filtros: ?source=youtube|reddit|all (por defecto 'all'), ?metric=neg_share|volume,
+    ?direction=spike|drop, ?from=/?to= (YYYY-MM-DD). Ordenados por fecha.
+    """
+    source = request.args.get('source', 'all')
+    metric = request.args.get('metric')
+    direction = request.args.get('direction')
+    from_date = request.args.get('from', '2020-10-24')
+    to_date = request.args.get('to', '2025-10-23')
+    if source not in ('youtube', 'reddit', 'all'):
+        return jsonify({"error": "source debe ser youtube, reddit o all"}), 400
+    if metric not in (None, 'neg_share', 'volume'):
+        return jsonify({"error": "metric debe ser neg_share o volume"}), 400
+    if direction not in (None, 'spike', 'drop'):
+        return jsonify({"error": "direction debe ser spike o drop"}), 400
+    try:
+        from_date = date.fromisoformat(from_date).isoformat()
+        to_date = date.fromisoformat(to_date).isoformat()
+    except ValueError:
+        return jsonify({"error": "Fechas inválidas (YYYY-MM-DD)"}), 400
+
+    sql = f"""
+        SELECT bucket_date, metric, value, baseline_mean, baseline_std, zscore,
+               direction, total_posts
+        FROM {ANOMALIES_TABLE}
+        WHERE source = ?
+    """
+    params = [source]
+    if metric:
+        sql += " AND metric = ?"
+        params.append(metric)
+    if direction:
+        sql += " AND direction = ?"
+        params.append(direction)
+    sql += " AND bucket_date >= ? AND bucket_date <= ? ORDER BY bucket_date, metric"
+    params.extend([from_date, to_date])
+
+    try:
+        with db_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if ANOMALIES_TABLE in str(e):
+            return jsonify({"error": "Falta la tabla sentiment_anomalies (scripts/anomalies.py)"}), 503
+        print(f"Error en /anomalies: {e}")
+        return jsonify({"error": "Datos no disponibles"}), 500
+    except Exception as e:
+        print(f"Error en /anomalies: {e}")
+        return jsonify({"error": "Datos no disponibles"}), 500
+
+    return jsonify([dict(row) for row in rows])
+
 # --- ¡NUEVO ENDPOINT AÑADIDO AQUÍ! ---
-@app.route('/series/engagement_by_sentiment')
+@api.route('/series/engagement_by_sentiment')
+@cached
 def get_engagement_by_sentiment():
     """
     Calcula el promedio de likes y respuestas por sentimiento.
     Usa los filtros de fecha 'from' y 'to'.
     """
-    # 1. Conexión a la DB (siguiendo tu patrón de /kpis, /series, etc.)
-    conn = get_db_connection()
-    if conn:
-        conn.row_factory = sqlite3.Row
-    else:
-        return jsonify({"error": "Datos no disponibles"}), 500
-
-    # 2. Obtener parámetros de fecha (igual que en tus otros endpoints)
+    # 1. Obtener parámetros de fecha (igual que en tus otros endpoints)
     from_date = request.args.get('from', '2020-10-24')
     to_date = request.args.get('to', '2025-10-23')
+    try:
+        date.fromisoformat(from_date)
+        before = day_after(to_date)
+    except ValueError:
+        return jsonify({"error": "Fechas inválidas (YYYY-MM-DD)"}), 400
+
+    # Con el almacén en memoria (API_COMMENT_STORE) es un corte de arrays, sin JOIN
+    try:
+        store = get_comment_store()
+        if store is not None:
+            return jsonify(store.engagement_by_sentiment(from_date, to_date, 'youtube'))
+    except Exception as e:
+        print(f"Error en /series/engagement_by_sentiment: {e}")
+        return jsonify({"error": str(e)}), 500
 
-    # 3. Consulta SQL
-    #    Usa 'p.created_at' (visto en tu endpoint /topics) para las fechas.
+    # 2. Consulta SQL
+    #    Rango sobre created_at crudo (to inclusivo) y scores del modelo de
+    #    referencia: sale de idx_posts_source_created + idx_scores_post_model_label
+    #    sin leer las tablas.
     sql = """
         SELECT
             s.sentiment_label,
             AVG(p.like_count)  AS avg_likes,
             AVG(p.reply_count) AS avg_replies
-        FROM scores AS s
-        JOIN posts  AS p ON s.post_id = p.post_id
+        FROM posts  AS p
+        JOIN scores AS s ON s.post_id = p.post_id AND s.model_name = ?
         WHERE p.source = 'youtube'
-        AND date(p.created_at) BETWEEN ? AND ?  -- Filtro de fecha
+        AND p.created_at >= ? AND p.created_at < ?  -- Filtro de fecha
         GROUP BY s.sentiment_label
         ORDER BY s.sentiment_label;
     """
     
     try:
-        # 4. Ejecutar y formatear (igual que en tu endpoint /series)
-        cursor = conn.cursor()
-        rows = cursor.execute(sql, (from_date, to_date)).fetchall()
-        conn.close()
+        # 3. Ejecutar con una conexión del pool
+        with db_connection() as conn:
+            rows = conn.execute(sql, (SENTIMENT_MODEL, from_date, before)).fetchall()
         
-        # 5. Formatear la salida para el JSON que espera el frontend
+        # 4. Formatear la salida para el JSON que espera el frontend
         data = []
         for row in rows:
             data.append({
@@ -221,98 +498,111 @@ def get_engagement_by_sentiment():
         return jsonify(data)
         
     except Exception as e:
-        # 6. Manejo de errores (igual que en tus otros endpoints)
+        # 5. Manejo de errores (igual que en tus otros endpoints)
         print(f"Error en /series/engagement_by_sentiment: {e}")
         return jsonify({"error": str(e)}), 500
 # ------------------------------------
 
-# (Asegúrate de que 'AGGREGATES_TABLE' esté definida arriba en tu archivo)
 
-@app.route('/sentiment_timeline')
-def get_sentiment_timeline():
+@api.route('/series/engagement_stats')
+@cached
+def get_engagement_stats():
     """
-    Serie de sentimiento normalizado (%), agregada por semestre.
-    Usa la tabla 'aggregates' como fuente diaria y agrupa en pandas.
+    Distribución de likes y replies por bucket de tiempo y sentimiento:
+    count y {mean, median, p90, p99} de cada métrica (engagement_stats.py).
+    Filtros: ?from=/?to= (YYYY-MM-DD), ?source=youtube|reddit|all (por defecto
+    'youtube'), ?granularity= como /series (por defecto 'month').
     """
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Datos no disponibles"}), 500
-
     from_date = request.args.get('from', '2020-10-24')
-    to_date   = request.args.get('to',   '2025-10-23')
+    to_date = request.args.get('to', '2025-10-23')
+    source = request.args.get('source', 'youtube')
+    granularity = request.args.get('granularity', 'month')
+    try:
+        date.fromisoformat(from_date)
+        before = day_after(to_date)
+    except ValueError:
+        return jsonify({"error": "Fechas inválidas (YYYY-MM-DD)"}), 400
+    if source not in ('youtube', 'reddit', 'all'):
+        return jsonify({"error": "source debe ser youtube, reddit o all"}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity debe ser una de {', '.join(GRANULARITIES)}"}), 400
 
-    # Traemos datos DIARIOS desde aggregates
-    query = f"""
-        SELECT
-            bucket_date AS date,
-            pos,
-            neu,
-            neg,
-            total_posts AS total
-        FROM {AGGREGATES_TABLE}
-        WHERE granularity = 'day'
-          AND bucket_date BETWEEN ? AND ?
-          AND total_posts > 0
-        ORDER BY bucket_date
+    try:
+        store = get_comment_store()
+        if store is not None:
+            return jsonify(store.engagement_stats(from_date, to_date, source, granularity))
+
+        # Sin almacén: una sola lectura de las cuatro columnas del rango (sale
+        # de los índices de created_at y de scores) y el mismo cálculo vectorizado
+        sql = """
+            SELECT substr(p.created_at, 1, 10), s.sentiment_label, p.like_count, p.reply_count
+            FROM posts AS p
+            JOIN scores AS s ON s.post_id = p.post_id AND s.model_name = ?
+            WHERE p.created_at >= ? AND p.created_at < ?
+        """
+        params = [SENTIMENT_MODEL, from_date, before]
+        if source != 'all':
+            sql += " AND p.source = ?"
+            params.append(source)
+        with db_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        day, label, metrics = columns_from_rows(rows, LABELS)
+        return jsonify(summarize(day, label, metrics, granularity, LABELS))
+
+    except Exception as e:
+        print(f"Error en /series/engagement_stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+# (Asegúrate de que 'AGGREGATES_TABLE' esté definida arriba en tu archivo)
+
+@api.route('/sentiment_timeline')
+@cached
+def get_sentiment_timeline():
+    """
+    Serie de sentimiento normalizado (%), agregada por semestre.
+    Acepta ?granularity= (por defecto 'semester') y ?source= como /series.
+    Cada punto usa la fecha de inicio del bucket (S1 -> YYYY-01-01, S2 -> YYYY-07-01).
     """
+    try:
+        buckets, values = get_resampled_series('semester')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        df = pd.read_sql_query(query, conn, params=(from_date, to_date))
-        conn.close()
-
-        if df.empty:
-            return jsonify([])
-
-        # Aseguramos que 'date' sea datetime
-        df['date'] = pd.to_datetime(df['date'])
-
-        # Año y semestre (1 = ene–jun, 2 = jul–dic)
-        df['year'] = df['date'].dt.year
-        df['semester'] = df['date'].dt.month.apply(lambda m: 1 if m <= 6 else 2)
-
-        # Agrupamos por año + semestre (sumando volúmenes)
-        agg = (
-            df.groupby(['year', 'semester'], as_index=False)
-              .agg({'pos': 'sum', 'neu': 'sum', 'neg': 'sum', 'total': 'sum'})
-        )
-
-        # Para Chart.js seguimos usando un campo 'date':
-        # ponemos una fecha representativa del semestre
-        # S1 -> YYYY-01-01, S2 -> YYYY-07-01
-        agg['date'] = agg.apply(
-            lambda r: f"{int(r['year'])}-01-01" if r['semester'] == 1
-                      else f"{int(r['year'])}-07-01",
-            axis=1
-        )
-
-        # Porcentajes
-        agg['pos_percent'] = (agg['pos'] / agg['total'] * 100).round(2)
-        agg['neg_percent'] = (agg['neg'] / agg['total'] * 100).round(2)
-        agg['neu_percent'] = (agg['neu'] / agg['total'] * 100).round(2)
+        total = values['total']
+        pcts = {
+            f"{k}_percent": np.round(values[k] / total * 100, 2)
+            for k in ('pos', 'neg', 'neu')
+        }
 
         # Solo las columnas que necesita el frontend
-        result = agg[['date', 'pos_percent', 'neg_percent', 'neu_percent']].to_dict(orient='records')
+        result = [
+            {
+                "date": str(d),
+                "pos_percent": float(pcts['pos_percent'][i]),
+                "neg_percent": float(pcts['neg_percent'][i]),
+                "neu_percent": float(pcts['neu_percent'][i]),
+            }
+            for i, d in enumerate(buckets)
+        ]
         return jsonify(result)
 
     except Exception as e:
         print(f"Error en /sentiment_timeline: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/top_comments')
+@api.route('/top_comments')
+@cached
 def get_top_comments():
     """
     Devuelve los comentarios históricos con más likes.
-    Opcionalmente se puede filtrar por rango de fechas usando ?from=YYYY-MM-DD&to=YYYY-MM-DD.
+    Opcionalmente se puede filtrar por rango de fechas usando ?from=YYYY-MM-DD&to=YYYY-MM-DD
+    y por temática con ?topic=<nombre> (tabla normalizada post_topics).
     """
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Datos no disponibles"}), 500
-
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-
     from_date = request.args.get('from')
     to_date   = request.args.get('to')
+    topic     = request.args.get('topic')
     limit     = request.args.get('limit', 8)
 
     try:
@@ -332,22 +622,55 @@ def get_top_comments():
             p.url,
             s.sentiment_label
         FROM posts AS p
-        LEFT JOIN scores AS s ON s.post_id = p.post_id
+        LEFT JOIN scores AS s ON s.post_id = p.post_id AND s.model_name = ?
         WHERE p.source = 'youtube'
     """
 
-    params = []
-    if from_date and to_date:
-        sql += " AND date(p.created_at) BETWEEN ? AND ?"
-        params.extend([from_date, to_date])
-
-    sql += " ORDER BY p.like_count DESC LIMIT ?"
+    params = [SENTIMENT_MODEL]
+    has_range = bool(from_date and to_date)
+    if has_range:
+        try:
+            date.fromisoformat(from_date)
+            params.extend([from_date, day_after(to_date)])
+        except ValueError:
+            return jsonify({"error": "Fechas inválidas (YYYY-MM-DD)"}), 400
+        sql += " AND p.created_at >= ? AND p.created_at < ?"
+
+    # Sin temática, el top-k sale del almacén en memoria y de SQLite sólo se
+    # leen (por rowid) las filas que se devuelven
+    if not topic:
+        try:
+            store = get_comment_store()
+            if store is not None:
+                positions = store.top_k(limit, from_date if has_range else None,
+                                        to_date if has_range else None, 'youtube')
+                with db_connection() as conn:
+                    return jsonify(store.fetch(conn, positions))
+        except Exception as e:
+            print(f"Error en /top_comments: {e}")
+            return jsonify({"error": "Datos no disponibles"}), 500
+
+    if topic:
+        sql += """
+          AND EXISTS (
+            SELECT 1
+            FROM post_topics AS pt
+            INNER JOIN topics AS t ON t.topic_id = pt.topic_id
+            WHERE pt.post_id = p.post_id
+              AND t.name = ?
+              AND COALESCE(pt.score, 1.0) > ?
+          )
+        """
+        params.extend([topic, TOPIC_THRESHOLD])
+
+    # Misma expresión que idx_posts_source_likes: recorre el índice ya ordenado.
+    # El desempate por post_id es el mismo que usa el almacén en memoria
+    sql += " ORDER BY COALESCE(p.like_count, 0) DESC, p.post_id DESC LIMIT ?"
     params.append(limit)
 
     try:
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-        conn.close()
+        with db_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
     except Exception as e:
         print(f"Error en /top_comments: {e}")
         return jsonify({"error": "Datos no disponibles"}), 500
@@ -367,5 +690,38 @@ def get_top_comments():
     return jsonify(data)
 
 
+@api.route('/comments')
+@cached
+def get_comments():
+    """
+    Explorador de comentarios con búsqueda y paginación por cursor.
+    Filtros: ?q= (texto, FTS5), ?sentiment=pos|neu|neg, ?topic=, ?source=youtube|reddit|all,
+    ?from=/?to= (YYYY-MM-DD). Orden: ?sort=likes|recent. Tamaño: ?limit= (hasta 200).
+    Devuelve {items, next_cursor}; la página siguiente se pide con ?cursor=<next_cursor>
+    y los mismos filtros.
+    """
+    try:
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    sql, params = build_query(filters, SENTIMENT_MODEL, TOPIC_THRESHOLD)
+    try:
+        with db_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'posts_fts' in str(e):
+            return jsonify({"error": "Falta el índice de búsqueda (scripts/migrar_fts.py)"}), 503
+        print(f"Error en /comments: {e}")
+        return jsonify({"error": "Datos no disponibles"}), 500
+    except Exception as e:
+        print(f"Error en /comments: {e}")
+        return jsonify({"error": "Datos no disponibles"}), 500
+
+    return jsonify(page_from_rows(rows, filters))
+
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Servidor de desarrollo; para producción ver wsgi.py / gunicorn.conf.py
+    config = Config()
+    create_app(config).run(host=config.HOST, port=config.PORT, debug=config.DEBUG)
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Caché de respuestas de la API (LRU + TTL) con ETag fuerte.
+
+La clave es endpoint + parámetros de la query ordenados. Cada entrada guarda
+el sello de versión de la DB con el que se calculó: si un script escribe en
+la base, el sello cambia y la entrada deja de ser válida. Las respuestas
+llevan ETag y 'Cache-Control: no-cache', así el navegador revalida y recibe
+304 sin cuerpo mientras los datos no cambien.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+
+class ResponseCache:
+    """Diccionario LRU acotado con expiración por tiempo y por versión de DB."""
+
+    def __init__(self, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["stamp"] != stamp or time.monotonic() - entry["created"] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, stamp, body, mimetype):
+        entry = {
+            "stamp": stamp,
+            "created": time.monotonic(),
+            "body": body,
+            "mimetype": mimetype,
+            "etag": hashlib.sha256(body).hexdigest()[:32],
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_response(get_cache, get_stamp):
+    """
+    Decorador para endpoints GET: sirve desde memoria si la DB no cambió y
+    responde 304 cuando el navegador ya tiene la misma versión (If-None-Match).
+    Sólo se guardan respuestas 200. 'get_cache' devuelve la ResponseCache de la app.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            cache = get_cache()
+            stamp = get_stamp()
+
+            entry = cache.get(key, stamp)
+            if entry is None:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                entry = cache.put(key, stamp, resp.get_data(), resp.mimetype)
+
+            if request.if_none_match.contains(entry["etag"]):
+                resp = Response(status=304)
+            else:
+                resp = Response(entry["body"], mimetype=entry["mimetype"])
+            resp.set_etag(entry["etag"])
+            resp.headers["Cache-Control"] = "public, no-cache"
+            return resp
+        return wrapper
+    return decorator
@@ -0,0 +1,137 @@
+"""
+Verifica con EXPLAIN QUERY PLAN que las consultas de la API usen índices.
+
+Llama a cada endpoint con el cliente de pruebas de Flask contra la DB de
+DATABASE_URL, captura el SQL que realmente se ejecuta (trace callback de
+sqlite3, con los parámetros ya sustituidos) y revisa el plan de cada SELECT.
+Cuentan como falla un 'SCAN <tabla>' sin índice, un índice automático y un
+recorrido entero de un índice seguido de un ordenamiento de todo el resultado
+(el índice no aporta ni rango ni orden), salvo las lecturas completas que son
+intencionales (ALLOWED_SCANS).
+
+Correr después de scripts/migrar_indices.py:
+
+    DATABASE_URL=../data/databaser.db python check_query_plans.py
+
+Sale con código 1 si alguna consulta hace un recorrido completo.
+"""
+import re
+import sqlite3
+import sys
+
+from app import create_app
+from config import Config
+
+# Tablas que se leen completas a propósito
+ALLOWED_SCANS = {
+    'aggregates': 'carga del índice de sumas acumuladas (una vez por versión de la DB)',
+    'events': 'lista completa de eventos (pocas filas)',
+}
+
+# (método, url, body) representativos de cada endpoint y sus variantes de filtros
+REQUESTS = [
+    ('GET', '/kpis?from=2024-01-01&to=2024-12-31', None),
+    ('GET', '/series?granularity=week', None),
+    ('GET', '/sentiment_timeline', None),
+    ('POST', '/kpis/batch', {"events": ["2024-03-01", "2024-06-01"], "days": 30}),
+    ('GET', '/topics?from=2024-01-01&to=2024-06-30', None),
+    ('GET', '/events', None),
+    ('GET', '/events/impact', None),
+    ('GET', '/anomalies', None),
+    ('GET', '/anomalies?metric=neg_share&from=2023-01-01&to=2023-12-31', None),
+    ('GET', '/series/engagement_by_sentiment?from=2024-01-01&to=2024-06-30', None),
+    ('GET', '/series/engagement_stats?granularity=week&source=all', None),
+    ('GET', '/top_comments', None),
+    ('GET', '/top_comments?from=2024-01-01&to=2024-01-31&limit=20', None),
+    ('GET', '/top_comments?topic=Música', None),
+    ('GET', '/comments', None),
+    ('GET', '/comments?source=youtube&limit=20', None),
+    ('GET', '/comments?sort=recent', None),
+    ('GET', '/comments?sort=recent&source=youtube&from=2024-01-01&to=2024-03-31', None),
+    ('GET', '/comments?sentiment=neg&topic=Música', None),
+    ('GET', '/comments?q=kanye', None),
+]
+# Además se pide la segunda página de estas, con el cursor de la primera
+PAGED = ['/comments', '/comments?source=youtube&limit=20', '/comments?sort=recent']
+
+_SCAN = re.compile(r'^SCAN (\w+)( USING (?:COVERING )?INDEX \w+)?$')
+
+
+def capture_sql(app):
+    """Hace que las conexiones nuevas del pool anoten su SQL en la lista devuelta."""
+    statements = []
+    pool = app.extensions['ye_api'].pool
+    connect = pool._connect
+
+    def traced_connect():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    pool._connect = traced_connect
+    return statements
+
+
+def run_requests(client):
+    """Ejecuta REQUESTS (y las páginas siguientes) de a una: genera (método, url, respuesta)."""
+    for method, url, body in REQUESTS:
+        resp = client.open(url, method=method, json=body)
+        yield method, url, resp
+        if url in PAGED and resp.status_code == 200 and resp.json.get('next_cursor'):
+            sep = '&' if '?' in url else '?'
+            next_url = f"{url}{sep}cursor={resp.json['next_cursor']}"
+            yield 'GET', next_url, client.get(next_url)
+
+
+def plan_problems(conn, sql):
+    """Líneas del plan que son recorridos completos no permitidos."""
+    aliases = _aliases(sql)
+    plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    full_sort = 'USE TEMP B-TREE FOR ORDER BY' in plan
+    problems = []
+    for detail in plan:
+        m = _SCAN.match(detail)
+        if m and aliases.get(m.group(1), m.group(1)) not in ALLOWED_SCANS:
+            if not m.group(2) or full_sort:
+                problems.append(detail)
+        elif 'AUTOMATIC' in detail:
+            problems.append(detail)
+    return problems
+
+
+def _aliases(sql):
+    """{alias: tabla} de las cláusulas FROM/JOIN 'tabla AS alias'."""
+    return {alias: table for table, alias in re.findall(r'\b(\w+)\s+AS\s+(\w+)', sql, re.IGNORECASE)}
+
+
+def main():
+    config = Config(PRELOAD=False, CACHE_MAX_ENTRIES=0)
+    app = create_app(config)
+    statements = capture_sql(app)
+
+    failures = 0
+    print(f"Planes de consulta de la API sobre {config.DB_PATH}\n")
+    with app.test_client() as client, sqlite3.connect(config.DB_PATH) as conn:
+        for method, url, resp in run_requests(client):
+            executed = [s for s in statements if s.lstrip().upper().startswith(('SELECT', 'WITH'))]
+            statements.clear()
+            if resp.status_code != 200:
+                print(f"  ?  {method} {url}: HTTP {resp.status_code} {resp.get_json(silent=True)}")
+                continue
+            if not executed:
+                print(f"  ·  {method} {url} (sin SQL: índice en memoria o caché)")
+                continue
+            problems = [p for sql in executed for p in plan_problems(conn, sql)]
+            failures += bool(problems)
+            print(f"  {'✗' if problems else '✓'}  {method} {url} ({len(executed)} consultas)")
+            for detail in problems:
+                print(f"       recorrido completo: {detail}")
+
+    if failures:
+        print(f"\n✗ {failures} endpoints con recorridos completos (¿falta correr scripts/migrar_indices.py?)")
+        sys.exit(1)
+    print("\n✓ Todas las consultas usan índices")
+
+
+if __name__ == '__main__':
+    main()
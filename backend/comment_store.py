@@ -0,0 +1,215 @@
+"""
+Almacén en memoria de los comentarios para consultas analíticas de la API.
+
+Guarda una fila por post en arrays de NumPy ordenados por fecha: día (días
+desde 1970), likes, replies (NULL -> 0 más una máscara de presencia, como
+AVG de SQL), fuente y etiqueta de sentimiento del modelo de referencia como
+códigos int8, el rango del post_id (desempate del top por likes, como el
+ORDER BY de SQL) y el rowid para traer el texto de SQLite sólo de las filas
+que se devuelven. Son ~32 bytes por post (~2.5 MB para 80k comentarios).
+
+Un rango de fechas es un corte [lo, hi) obtenido con dos búsquedas binarias;
+los promedios por sentimiento salen de np.bincount sobre ese corte y el top-k
+por likes recorre un orden global precalculado (o, si el rango es corto,
+ordena sólo el corte). Las distribuciones por bucket (mediana, p90, p99)
+salen de engagement_stats.summarize sobre el mismo corte. Se recarga cuando cambia el sello de la DB, igual que
+el índice de agregados.
+"""
+import threading
+from datetime import date
+
+import numpy as np
+
+from engagement_stats import summarize
+from prefix_index import db_stamp
+
+SOURCES = ('youtube', 'reddit')
+LABELS = ('pos', 'neu', 'neg')
+NO_LABEL = -1
+SHORT_RANGE = 0.25      # rangos con menos de esta fracción de filas se ordenan aparte
+TOPK_CHUNK = 4096
+
+
+def _day(value):
+    return (date.fromisoformat(value[:10]) - date(1970, 1, 1)).days
+
+
+def _by_likes(likes, post_rank):
+    """Orden por likes descendente y post_id descendente (np.lexsort: la última clave manda)."""
+    return np.lexsort((-post_rank.astype(np.int64), -likes.astype(np.int64)))
+
+
+class CommentStore:
+    """Columnas de posts ⋈ scores (modelo 'model_name') en memoria."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.cols = None        # dict de arrays, se reemplaza entero en cada carga
+        self.stamp = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return 0 if self.cols is None else len(self.cols['day'])
+
+    # --- Carga ---
+
+    def load(self, conn, stamp=None):
+        """Lee posts y la etiqueta de sentimiento en una pasada y arma los arrays."""
+        rows = conn.execute("""
+            SELECT p.rowid, p.post_id, substr(p.created_at, 1, 10), p.like_count, p.reply_count,
+                   p.source, s.sentiment_label
+            FROM posts AS p
+            LEFT JOIN scores AS s ON s.post_id = p.post_id AND s.model_name = ?
+        """, (self.model_name,)).fetchall()
+
+        if rows:
+            rowid, post_id, day, likes, replies, source, label = zip(*rows)
+        else:
+            rowid = post_id = day = likes = replies = source = label = ()
+        source_code = {s: i for i, s in enumerate(SOURCES)}
+        label_code = {s: i for i, s in enumerate(LABELS)}
+
+        day = np.array(day, dtype='datetime64[D]').astype(np.int32)
+        order = np.argsort(day, kind='stable')
+        likes = np.array([-1 if v is None else v for v in likes], dtype=np.int64)
+        replies = np.array([-1 if v is None else v for v in replies], dtype=np.int64)
+        # Rango de cada post_id en orden de texto (el de SQLite para ASCII/UTF-8)
+        _, post_rank = np.unique(np.array(post_id, dtype=str), return_inverse=True)
+        cols = {
+            'rowid': np.array(rowid, dtype=np.int64),
+            'post_rank': post_rank.astype(np.int32).reshape(-1),
+            'day': day,
+            'likes': np.maximum(likes, 0).astype(np.int32),
+            'has_likes': likes >= 0,
+            'replies': np.maximum(replies, 0).astype(np.int32),
+            'has_replies': replies >= 0,
+            'source': np.array([source_code.get(s, -1) for s in source], dtype=np.int8),
+            'label': np.array([label_code.get(s, NO_LABEL) for s in label], dtype=np.int8),
+        }
+        cols = {k: v[order] for k, v in cols.items()}
+        # Posiciones de mayor a menor likes y, en empate, post_id descendente:
+        # el mismo orden que ORDER BY likes DESC, post_id DESC de /top_comments
+        cols['by_likes'] = _by_likes(cols['likes'], cols['post_rank']).astype(np.int32)
+
+        self.cols, self.stamp = cols, stamp
+        return self
+
+    def refresh_if_stale(self, db_path, connection):
+        """Recarga si el sello de la DB cambió desde la última carga."""
+        stamp = db_stamp(db_path)
+        if stamp == self.stamp:
+            return self
+        with self._lock:
+            if stamp != self.stamp:
+                with connection() as conn:
+                    self.load(conn, stamp)
+        return self
+
+    # --- Consultas ---
+
+    def _bounds(self, cols, from_date, to_date):
+        """Corte [lo, hi) de las filas con fecha en el rango (inclusivo); None = sin límite."""
+        day = cols['day']
+        lo = 0 if from_date is None else int(np.searchsorted(day, _day(from_date), 'left'))
+        hi = len(day) if to_date is None else int(np.searchsorted(day, _day(to_date), 'right'))
+        return lo, max(lo, hi)
+
+    def engagement_by_sentiment(self, from_date, to_date, source='youtube'):
+        """
+        Promedio de likes y replies por etiqueta en el rango, con la misma
+        semántica que AVG en SQL (los NULL no cuentan). Filas de las etiquetas
+        presentes, ordenadas por nombre.
+        """
+        cols = self.cols
+        lo, hi = self._bounds(cols, from_date, to_date)
+        label = cols['label'][lo:hi]
+        keep = (label != NO_LABEL) & (cols['source'][lo:hi] == SOURCES.index(source))
+        label = label[keep]
+
+        def average(values, present):
+            n = np.bincount(label, weights=present[lo:hi][keep], minlength=len(LABELS))
+            total = np.bincount(label, weights=values[lo:hi][keep], minlength=len(LABELS))
+            return np.divide(total, n, out=np.zeros(len(LABELS)), where=n > 0)
+
+        count = np.bincount(label, minlength=len(LABELS))
+        avg_likes = average(cols['likes'], cols['has_likes'])
+        avg_replies = average(cols['replies'], cols['has_replies'])
+        return [
+            {"sentiment_label": LABELS[i], "avg_likes": round(float(avg_likes[i]), 2),
+             "avg_replies": round(float(avg_replies[i]), 2)}
+            for i in sorted(range(len(LABELS)), key=lambda i: LABELS[i]) if count[i]
+        ]
+
+    def engagement_stats(self, from_date, to_date, source='youtube', granularity='month'):
+        """
+        count, mean, median, p90 y p99 de likes y replies por bucket y etiqueta
+        (engagement_stats.summarize) para el rango; source='all' no filtra.
+        """
+        cols = self.cols
+        lo, hi = self._bounds(cols, from_date, to_date)
+        keep = cols['label'][lo:hi] != NO_LABEL
+        if source != 'all':
+            keep &= cols['source'][lo:hi] == SOURCES.index(source)
+
+        def pick(name):
+            return cols[name][lo:hi][keep]
+
+        metrics = {
+            'likes': (pick('likes'), pick('has_likes')),
+            'replies': (pick('replies'), pick('has_replies')),
+        }
+        return summarize(pick('day'), pick('label'), metrics, granularity, LABELS)
+
+    def top_k(self, k, from_date=None, to_date=None, source=None):
+        """Posiciones de los k posts con más likes en el rango (y fuente), de mayor a menor."""
+        cols = self.cols
+        lo, hi = self._bounds(cols, from_date, to_date)
+        code = None if source is None else SOURCES.index(source)
+        if hi - lo < SHORT_RANGE * len(cols['day']):
+            pos = np.arange(lo, hi)
+            if code is not None:
+                pos = pos[cols['source'][lo:hi] == code]
+            return pos[_by_likes(cols['likes'][pos], cols['post_rank'][pos])[:k]]
+
+        found = []
+        by_likes = cols['by_likes']
+        for start in range(0, len(by_likes), TOPK_CHUNK):
+            cand = by_likes[start:start + TOPK_CHUNK]
+            ok = (cand >= lo) & (cand < hi)
+            if code is not None:
+                ok &= cols['source'][cand] == code
+            found.extend(cand[ok][:k - len(found)])
+            if len(found) >= k:
+                break
+        return np.array(found, dtype=np.int64)
+
+    def fetch(self, conn, positions):
+        """
+        Filas completas (con texto) de esas posiciones, en el mismo orden, con
+        la etiqueta de sentimiento del almacén. Una sola consulta por rowid.
+        """
+        cols = self.cols
+        rowids = [int(r) for r in cols['rowid'][positions]]
+        if not rowids:
+            return []
+        marks = ','.join('?' * len(rowids))
+        by_rowid = {row['rowid']: row for row in conn.execute(f"""
+            SELECT rowid, post_id, author, text, like_count, created_at, url
+            FROM posts WHERE rowid IN ({marks})
+        """, rowids)}
+        data = []
+        for pos, rowid in zip(positions, rowids):
+            row = by_rowid.get(rowid)
+            if row is None:
+                continue
+            label = int(cols['label'][pos])
+            data.append({
+                "post_id": row["post_id"],
+                "author": row["author"],
+                "text": row["text"],
+                "like_count": row["like_count"],
+                "created_at": row["created_at"],
+                "url": row["url"],
+                "sentiment_label": LABELS[label] if label != NO_LABEL else None,
+            })
+        return data
@@ -0,0 +1,186 @@
+"""
+Consulta paginada del explorador de comentarios (/comments).
+
+Paginación por cursor (keyset): cada página pide las filas estrictamente
+"después" de la última clave entregada, (likes, post_id) o (created_at, post_id),
+así que la página 500 cuesta lo mismo que la primera, sin OFFSET. El cursor es
+opaco para el cliente (JSON en base64) y lleva el orden con el que se generó.
+
+La búsqueda de texto usa el índice FTS5 'posts_fts' (scripts/migrar_fts.py).
+Los filtros de fecha son rangos sobre created_at y el orden coincide con los
+índices de scripts/migrar_indices.py (idx_posts_likes, idx_posts_source_*).
+"""
+import base64
+import json
+import re
+from datetime import date, timedelta
+
+SORTS = {
+    'likes': 'COALESCE(p.like_count, 0)',
+    'recent': 'p.created_at',
+}
+# Tipo de la clave de cada orden dentro del cursor (lo que devuelve SQLite)
+CURSOR_KEY_TYPES = {
+    'likes': (int, float),
+    'recent': (str,),
+}
+SOURCES = ('youtube', 'reddit', 'all')
+SENTIMENTS = ('pos', 'neu', 'neg')
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+_TERM = re.compile(r'\w+\*?')
+
+
+def fts_query(text):
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5 segura: cada
+    palabra entre comillas (AND implícito), con '*' final como prefijo.
+    Devuelve None si no queda ninguna palabra.
+    """
+    terms = []
+    for term in _TERM.findall(text or ''):
+        prefix = term.endswith('*')
+        terms.append(f'"{term.rstrip("*")}"' + ('*' if prefix else ''))
+    return ' '.join(terms) or None
+
+
+def day_after(to_date):
+    """
+    Límite superior exclusivo para un 'to' inclusivo: created_at < día siguiente.
+    Comparar created_at crudo (y no date(created_at)) permite usar los índices.
+    """
+    return (date.fromisoformat(to_date) + timedelta(days=1)).isoformat()
+
+
+def encode_cursor(sort, key, post_id):
+    raw = json.dumps([sort, key, post_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """(clave, post_id) de un cursor; ValueError si no es válido para este orden."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, key, post_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"cursor inválido: {e}") from None
+    if cursor_sort != sort:
+        raise ValueError("el cursor corresponde a otro orden")
+    # Sólo escalares del tipo esperado llegan a los parámetros de la consulta
+    if isinstance(key, bool) or not isinstance(key, CURSOR_KEY_TYPES[sort]):
+        raise ValueError("cursor inválido: clave de orden con tipo inesperado")
+    if not isinstance(post_id, str):
+        raise ValueError("cursor inválido: post_id debe ser texto")
+    return key, post_id
+
+
+def parse_filters(args):
+    """Valida los parámetros de /comments. ValueError con un mensaje para el cliente."""
+    sort = args.get('sort', 'likes')
+    if sort not in SORTS:
+        raise ValueError(f"sort debe ser uno de {', '.join(SORTS)}")
+    source = args.get('source', 'all')
+    if source not in SOURCES:
+        raise ValueError(f"source debe ser uno de {', '.join(SOURCES)}")
+    sentiment = args.get('sentiment')
+    if sentiment and sentiment not in SENTIMENTS:
+        raise ValueError(f"sentiment debe ser uno de {', '.join(SENTIMENTS)}")
+
+    limit = int(args.get('limit', DEFAULT_LIMIT))
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit debe estar entre 1 y {MAX_LIMIT}")
+
+    from_date, to_date = args.get('from'), args.get('to')
+    filters = {
+        'sort': sort,
+        'source': source,
+        'sentiment': sentiment,
+        'topic': args.get('topic'),
+        'match': fts_query(args.get('q')),
+        'from': date.fromisoformat(from_date).isoformat() if from_date else None,
+        'before': day_after(to_date) if to_date else None,
+        'limit': limit,
+        'after': None,
+    }
+    if args.get('cursor'):
+        filters['after'] = decode_cursor(args['cursor'], sort)
+    return filters
+
+
+def build_query(filters, sentiment_model, topic_threshold):
+    """SQL y parámetros de una página (pide limit + 1 filas para saber si hay más)."""
+    sort_key = SORTS[filters['sort']]
+    sql = f"""
+        SELECT
+            p.post_id, p.source, p.author, p.text, p.like_count, p.reply_count,
+            p.created_at, p.url, s.sentiment_label,
+            {sort_key} AS sort_key
+        FROM posts AS p
+        LEFT JOIN scores AS s ON s.post_id = p.post_id AND s.model_name = ?
+        WHERE 1 = 1
+    """
+    params = [sentiment_model]
+
+    if filters['source'] != 'all':
+        sql += " AND p.source = ?"
+        params.append(filters['source'])
+    if filters['from']:
+        sql += " AND p.created_at >= ?"
+        params.append(filters['from'])
+    if filters['before']:
+        sql += " AND p.created_at < ?"
+        params.append(filters['before'])
+    if filters['sentiment']:
+        sql += " AND s.sentiment_label = ?"
+        params.append(filters['sentiment'])
+    if filters['match']:
+        sql += " AND p.rowid IN (SELECT rowid FROM posts_fts WHERE posts_fts MATCH ?)"
+        params.append(filters['match'])
+    if filters['topic']:
+        sql += """
+          AND EXISTS (
+            SELECT 1
+            FROM post_topics AS pt
+            INNER JOIN topics AS t ON t.topic_id = pt.topic_id
+            WHERE pt.post_id = p.post_id
+              AND t.name = ?
+              AND COALESCE(pt.score, 1.0) > ?
+          )
+        """
+        params.extend([filters['topic'], topic_threshold])
+    if filters['after']:
+        # Equivale a (clave, post_id) < (?, ?), pero escrito así el primer
+        # término acota un rango del índice (con row values SQLite no lo usa)
+        key, post_id = filters['after']
+        sql += f" AND {sort_key} <= ? AND ({sort_key} < ? OR p.post_id < ?)"
+        params.extend([key, key, post_id])
+
+    sql += f" ORDER BY {sort_key} DESC, p.post_id DESC LIMIT ?"
+    params.append(filters['limit'] + 1)
+    return sql, params
+
+
+def page_from_rows(rows, filters):
+    """Respuesta {items, next_cursor} a partir de las limit + 1 filas leídas."""
+    has_more = len(rows) > filters['limit']
+    rows = rows[:filters['limit']]
+    items = [
+        {
+            "post_id": row["post_id"],
+            "source": row["source"],
+            "author": row["author"],
+            "text": row["text"],
+            "like_count": row["like_count"],
+            "reply_count": row["reply_count"],
+            "created_at": row["created_at"],
+            "url": row["url"],
+            "sentiment_label": row["sentiment_label"],
+        }
+        for row in rows
+    ]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(filters['sort'], last["sort_key"], last["post_id"])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,51 @@
+"""
+Configuración de la API, tomada de variables de entorno.
+
+    DATABASE_URL        ruta a databaser.db (por defecto ../data/databaser.db
+                        relativo a este archivo, no al directorio actual)
+    API_HOST, API_PORT  dirección de escucha (127.0.0.1:5000)
+    API_WORKERS         procesos de gunicorn (por defecto min(4, núcleos))
+    API_THREADS         hilos por proceso (por defecto 4)
+    API_POOL_SIZE       conexiones SQLite por proceso (por defecto 8)
+    API_CACHE_ENTRIES   respuestas en la caché LRU (por defecto 256)
+    API_CACHE_TTL       segundos de vida de cada respuesta cacheada (600)
+    API_PRELOAD         '1' para cargar el índice de agregados al crear la app
+    API_COMMENT_STORE   '1' para servir engagement y top de comentarios desde
+                        arrays en memoria (comment_store.py); por defecto '0'
+                        (SQL)
+    API_DEBUG           '1' para el servidor de desarrollo con debug (python app.py);
+                        por defecto '0'
+"""
+import os
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'databaser.db')
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Config:
+    """Valores de configuración; se pueden sobrescribir por keyword (p.ej. en pruebas)."""
+
+    def __init__(self, **overrides):
+        self.DB_PATH = os.getenv('DATABASE_URL', DEFAULT_DB_PATH)
+        self.HOST = os.getenv('API_HOST', '127.0.0.1')
+        self.PORT = _env_int('API_PORT', 5000)
+        self.WORKERS = _env_int('API_WORKERS', min(4, os.cpu_count() or 1))
+        self.THREADS = _env_int('API_THREADS', 4)
+        self.POOL_SIZE = _env_int('API_POOL_SIZE', 8)
+        self.CACHE_MAX_ENTRIES = _env_int('API_CACHE_ENTRIES', 256)
+        self.CACHE_TTL_SECONDS = _env_int('API_CACHE_TTL', 600)
+        self.PRELOAD = _env_bool('API_PRELOAD', '1')
+        self.COMMENT_STORE = _env_bool('API_COMMENT_STORE', '0')
+        self.DEBUG = _env_bool('API_DEBUG', '0')
+
+        for key, value in overrides.items():
+            if not hasattr(self, key):
+                raise AttributeError(f"Opción de configuración desconocida: {key}")
+            setattr(self, key, value)
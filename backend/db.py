@@ -0,0 +1,77 @@
+"""
+Pool de conexiones SQLite de sólo lectura para la API.
+
+Cada conexión se abre una sola vez con URI 'mode=ro' y pragmas de lectura
+(mmap, caché de páginas, temp_store en memoria, query_only) y se reutiliza
+entre requests, conservando su caché de páginas y de sentencias preparadas.
+Siempre se devuelve al pool, aunque la consulta lance una excepción.
+"""
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+
+class ConnectionPool:
+    """Pool LIFO de conexiones de sólo lectura (las más calientes se reutilizan primero)."""
+
+    def __init__(self, db_path, size=8, cached_statements=256,
+                 mmap_size=256 * 1024 * 1024, cache_size_kib=64 * 1024):
+        self.db_path = db_path
+        self.size = size
+        self.cached_statements = cached_statements
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self._pool = queue.LifoQueue(maxsize=size)
+        self._pid = os.getpid()
+
+    def _connect(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,            # la conexión puede pasar de un hilo a otro vía el pool
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def _check_fork(self):
+        # Las conexiones SQLite no deben cruzar un fork: cada proceso arma su pool
+        if os.getpid() != self._pid:
+            self._pool = queue.LifoQueue(maxsize=self.size)
+            self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión del pool y la devuelve al salir del bloque."""
+        self._check_fork()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            yield conn
+        except BaseException:
+            # Por si quedó una transacción de lectura abierta a medias
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close_all(self):
+        """Cierra las conexiones inactivas del pool."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,19 @@
+# gunicorn.conf.py
+# Modo multi-proceso de la API. Los valores salen de config.py (variables API_*).
+#
+#   cd backend
+#   gunicorn -c gunicorn.conf.py wsgi:app
+
+from config import Config
+
+_config = Config()
+
+bind = f"{_config.HOST}:{_config.PORT}"
+workers = _config.WORKERS
+threads = _config.THREADS
+worker_class = "gthread"
+
+# Crear la app (y cargar el índice de agregados) en el maestro antes del fork:
+# los arrays de NumPy se comparten copy-on-write entre workers. Cada worker
+# abre su propio pool de conexiones SQLite al primer request.
+preload_app = _config.PRELOAD
@@ -0,0 +1,150 @@
+"""
+Índice de sumas acumuladas sobre los agregados diarios.
+
+Carga una vez las filas 'day' de la tabla aggregates en arrays de NumPy
+(uno por fuente) y responde cualquier rango from/to con dos lecturas y una
+resta, sin volver a recorrer la tabla. Se recarga sólo cuando cambian los
+archivos de la base de datos.
+
+Cada carga arma una instantánea inmutable (Snapshot) y la publica con una sola
+asignación. Las consultas toman una referencia local a la instantánea, así un
+hilo que recarga nunca le mezcla a otro el eje de una versión con las sumas de otra.
+"""
+import os
+import threading
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+FIELDS = ('pos', 'neu', 'neg', 'total', 'interactions')
+ALL_SOURCES = 'all'
+
+# origin: primer día del eje (date o None); cumsum: fuente -> {campo: array de largo n_days + 1}
+Snapshot = namedtuple('Snapshot', 'origin n_days cumsum stamp')
+EMPTY = Snapshot(None, 0, {}, None)
+
+
+def db_stamp(db_path):
+    """
+    Sello de versión de la DB: (mtime, tamaño) del archivo principal y del WAL.
+    Cambia con cualquier commit de cualquier proceso y no requiere SQL.
+    """
+    stamp = []
+    for path in (db_path, db_path + '-wal'):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+class AggregatesIndex:
+    """Sumas acumuladas por día y fuente construidas desde 'aggregates'."""
+
+    def __init__(self, table='aggregates'):
+        self.table = table
+        self.snapshot = EMPTY   # se reemplaza entera en cada carga
+        self._lock = threading.Lock()
+
+    @property
+    def stamp(self):
+        return self.snapshot.stamp
+
+    # --- Carga ---
+
+    def load(self, conn, stamp=None):
+        """Reconstruye los arrays leyendo las filas diarias de la tabla."""
+        rows = conn.execute(f"""
+            SELECT
+                source,
+                bucket_date,
+                COALESCE(pos, 0),
+                COALESCE(neu, 0),
+                COALESCE(neg, 0),
+                COALESCE(total_posts, 0),
+                COALESCE(total_interactions, 0)
+            FROM {self.table}
+            WHERE granularity = 'day'
+        """).fetchall()
+
+        cumsum = {}
+        origin, n_days = None, 0
+        if rows:
+            sources = np.array([r[0] for r in rows])
+            days = np.array([r[1][:10] for r in rows], dtype='datetime64[D]')
+            values = np.array([r[2:] for r in rows], dtype=np.int64)
+
+            origin_d = days.min()
+            offsets = (days - origin_d).astype(np.int64)
+            n_days = int(offsets.max()) + 1
+            origin = origin_d.astype(object)
+
+            daily = {}
+            for source in np.unique(sources):
+                mask = sources == source
+                arr = np.zeros((n_days, len(FIELDS)), dtype=np.int64)
+                np.add.at(arr, offsets[mask], values[mask])
+                daily[str(source)] = arr
+
+            # Si la tabla no trae la fuente 'all', se arma sumando las demás
+            if ALL_SOURCES not in daily:
+                daily[ALL_SOURCES] = sum(daily.values())
+
+            for source, arr in daily.items():
+                acc = np.zeros((n_days + 1, len(FIELDS)), dtype=np.int64)
+                np.cumsum(arr, axis=0, out=acc[1:])
+                cumsum[source] = {f: acc[:, i] for i, f in enumerate(FIELDS)}
+
+        self.snapshot = Snapshot(origin, n_days, cumsum, stamp)
+        return self
+
+    def refresh_if_stale(self, db_path, connection):
+        """
+        Recarga si el sello de la DB cambió desde la última carga.
+        'connection' es un context manager que entrega una conexión a la DB.
+        """
+        stamp = db_stamp(db_path)
+        if stamp == self.stamp:
+            return self
+        with self._lock:
+            if stamp != self.stamp:
+                with connection() as conn:
+                    self.load(conn, stamp)
+        return self
+
+    # --- Consultas ---
+
+    @staticmethod
+    def _bounds(snap, from_date, to_date):
+        """Índices [lo, hi) sobre el eje de días de 'snap' para un rango inclusivo."""
+        if snap.origin is None:
+            return 0, 0
+        lo = (date.fromisoformat(from_date[:10]) - snap.origin).days
+        hi = (date.fromisoformat(to_date[:10]) - snap.origin).days + 1
+        lo = min(max(lo, 0), snap.n_days)
+        hi = min(max(hi, lo), snap.n_days)
+        return lo, hi
+
+    def range_totals(self, from_date, to_date, source=ALL_SOURCES):
+        """Totales de un rango: dos lecturas y una resta por campo."""
+        snap = self.snapshot
+        lo, hi = self._bounds(snap, from_date, to_date)
+        cs = snap.cumsum.get(source)
+        if cs is None:
+            return {f: 0 for f in FIELDS}
+        return {f: int(cs[f][hi] - cs[f][lo]) for f in FIELDS}
+
+    def daily(self, from_date, to_date, source=ALL_SOURCES):
+        """
+        Valores diarios de un rango como (días datetime64[D], {campo: array}).
+        Incluye los días sin datos con valor 0.
+        """
+        snap = self.snapshot
+        lo, hi = self._bounds(snap, from_date, to_date)
+        cs = snap.cumsum.get(source)
+        if cs is None or hi <= lo:
+            return np.array([], dtype='datetime64[D]'), {f: np.array([], dtype=np.int64) for f in FIELDS}
+        days = np.datetime64(snap.origin, 'D') + np.arange(lo, hi)
+        return days, {f: np.diff(cs[f][lo:hi + 1]) for f in FIELDS}
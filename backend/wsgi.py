@@ -0,0 +1,13 @@
+"""
+Punto de entrada WSGI para producción.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+La app se crea al importar este módulo; con preload_app (ver gunicorn.conf.py)
+eso ocurre una sola vez en el proceso maestro, que carga el índice de
+agregados antes de hacer fork de los workers.
+"""
+from app import create_app
+
+app = create_app()
@@ -0,0 +1,176 @@
+# aggregates.py
+# Mantenimiento incremental de 'aggregates' (día/semana × youtube/reddit/all),
+# que es lo que leen /kpis, /series y /sentiment_timeline, y de 'topic_daily'.
+#
+# Los triggers de pipeline_db anotan en 'aggregates_dirty' cada día tocado por
+# un score nuevo o re-puntuado, un cambio de engagement o de temas. refresh()
+# recalcula sólo esos días y sus semanas (lunes a domingo) con rangos sobre
+# posts.created_at (usa idx_posts_created) y vacía la lista, todo en una
+# transacción. Lo llaman el scoring y tematicas.py tras cada tanda confirmada.
+#
+# Las tablas derivadas de la serie completa, 'event_impact' (event_impact.py) y
+# 'sentiment_anomalies' (anomalies.py), no se recalculan en cada tanda: refresh()
+# anota en fetch_cursors (DERIVED_CURSOR) el primer día que quedó atrasado, y
+# refresh_derived() las pone al día una sola vez, en su propia transacción. Las
+# tandas intermedias llaman refresh(conn, derived=False) y la última (o cualquier
+# corrida suelta) refresh(conn), que incluye ese paso.
+# (CROSS JOIN fija el orden buckets -> posts -> scores: la tabla temporal no
+# tiene estadísticas y sin eso el planificador recorre 'scores' por cada bucket.)
+#
+# Uso:
+#   python aggregates.py          # recalcula los días pendientes
+#   python aggregates.py --todo   # reconstruye todos los buckets
+
+import sys
+import time
+from datetime import date
+
+import anomalies
+import event_impact
+from pipeline_db import (
+    DB_PATH, DERIVED_CURSOR, SENTIMENT_MODEL, UMBRAL_TEMAS,
+    clear_cursor, connect, ensure_schema, load_cursor, save_cursor,
+)
+
+INTERACCIONES = "COALESCE(p.like_count, 0) + COALESCE(p.reply_count, 0) + COALESCE(p.score, 0)"
+
+
+def mark_all_dirty(conn) -> None:
+    """Marca todos los días con posts (reconstrucción completa) y descarta los buckets actuales."""
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO aggregates_dirty SELECT DISTINCT date(created_at) FROM posts")
+        conn.execute("DELETE FROM aggregates")
+        conn.execute("DELETE FROM topic_daily")
+
+
+def refresh(conn, derived: bool = True) -> int:
+    """
+    Recalcula los buckets de los días sucios (y de sus semanas) en 'aggregates'
+    y los días en 'topic_daily'. Con derived=True además pone al día
+    'event_impact' y 'sentiment_anomalies' (refresh_derived); con False sólo
+    deja anotado desde qué día quedaron atrasadas. Devuelve cuántos días se
+    recalcularon.
+    """
+    ensure_schema(conn)
+    if conn.execute("SELECT 1 FROM aggregates_dirty LIMIT 1").fetchone() is None:
+        if derived:
+            refresh_derived(conn)
+        return 0
+
+    conn.execute("BEGIN IMMEDIATE")   # nadie más escribe días sucios mientras tanto
+    try:
+        # Buckets afectados con su rango [lo, hi) sobre created_at
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS _buckets (
+              granularity TEXT, bucket_date TEXT, lo TEXT, hi TEXT,
+              PRIMARY KEY (granularity, bucket_date)
+            )
+        """)
+        conn.execute("DELETE FROM temp._buckets")
+        conn.execute("""
+            INSERT INTO temp._buckets
+            SELECT 'day', bucket_date, bucket_date, date(bucket_date, '+1 day')
+            FROM aggregates_dirty WHERE bucket_date IS NOT NULL
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO temp._buckets
+            SELECT 'week', w, w, date(w, '+7 days')
+            FROM (SELECT date(bucket_date, 'weekday 0', '-6 days') AS w
+                  FROM temp._buckets WHERE granularity = 'day')
+        """)
+        n_days, first_day = conn.execute(
+            "SELECT COUNT(*), MIN(bucket_date) FROM temp._buckets WHERE granularity = 'day'"
+        ).fetchone()
+
+        # aggregates: borrar e insertar los buckets afectados (por fuente y 'all')
+        conn.execute("""
+            DELETE FROM aggregates
+            WHERE (granularity, bucket_date) IN (SELECT granularity, bucket_date FROM temp._buckets)
+        """)
+        conn.execute(f"""
+            INSERT INTO aggregates
+              (bucket_date, granularity, source, pos, neu, neg, total_posts, total_interactions)
+            SELECT b.bucket_date, b.granularity, p.source,
+                   SUM(s.sentiment_label = 'pos'), SUM(s.sentiment_label = 'neu'),
+                   SUM(s.sentiment_label = 'neg'), COUNT(*), SUM({INTERACCIONES})
+            FROM temp._buckets AS b
+            CROSS JOIN posts  AS p ON p.created_at >= b.lo AND p.created_at < b.hi
+            CROSS JOIN scores AS s ON s.post_id = p.post_id AND s.model_name = ?
+            GROUP BY b.granularity, b.bucket_date, p.source
+        """, (SENTIMENT_MODEL,))
+        conn.execute("""
+            INSERT INTO aggregates
+              (bucket_date, granularity, source, pos, neu, neg, total_posts, total_interactions)
+            SELECT a.bucket_date, a.granularity, 'all',
+                   SUM(a.pos), SUM(a.neu), SUM(a.neg), SUM(a.total_posts), SUM(a.total_interactions)
+            FROM aggregates AS a
+            INNER JOIN temp._buckets AS b ON b.granularity = a.granularity AND b.bucket_date = a.bucket_date
+            WHERE a.source != 'all'
+            GROUP BY a.granularity, a.bucket_date
+        """)
+
+        # topic_daily: mismos criterios que rollups.build_topic_rollup, sólo para los días sucios
+        conn.execute("""
+            DELETE FROM topic_daily
+            WHERE bucket_date IN (SELECT bucket_date FROM temp._buckets WHERE granularity = 'day')
+        """)
+        conn.execute("""
+            INSERT INTO topic_daily (bucket_date, topic, sentiment_label, total_posts)
+            SELECT b.bucket_date, t.name, s.sentiment_label, COUNT(*)
+            FROM temp._buckets AS b
+            CROSS JOIN posts       AS p  ON p.created_at >= b.lo AND p.created_at < b.hi
+            INNER JOIN post_topics AS pt ON pt.post_id = p.post_id
+            INNER JOIN topics      AS t  ON t.topic_id = pt.topic_id
+            INNER JOIN scores      AS s  ON s.post_id = p.post_id AND s.model_name = ?
+            WHERE b.granularity = 'day' AND COALESCE(pt.score, 1.0) > ?
+            GROUP BY 1, 2, 3
+        """, (SENTIMENT_MODEL, UMBRAL_TEMAS))
+
+        # Las derivadas quedan atrasadas desde el primer día recalculado
+        pending = load_cursor(conn, *DERIVED_CURSOR, "since")
+        if first_day and (pending is None or first_day < pending):
+            save_cursor(conn, *DERIVED_CURSOR, "since", first_day)
+
+        conn.execute("DELETE FROM aggregates_dirty")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if derived:
+        refresh_derived(conn)
+    return n_days
+
+
+def refresh_derived(conn) -> bool:
+    """
+    Recalcula 'event_impact' y las detecciones de 'sentiment_anomalies' desde
+    el día anotado por refresh(), si hay alguno pendiente o si cambió 'events'.
+    Devuelve si hubo algo que recalcular.
+    """
+    pending = load_cursor(conn, *DERIVED_CURSOR, "since")
+    if pending is None and not event_impact.events_changed(conn):
+        return False
+    with conn:
+        event_impact.rebuild(conn)
+        if pending is not None:
+            anomalies.update(conn, date.fromisoformat(pending))
+            clear_cursor(conn, *DERIVED_CURSOR, "since")
+    return True
+
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        ensure_schema(conn)
+        if "--todo" in sys.argv:
+            mark_all_dirty(conn)
+        t0 = time.perf_counter()
+        n = refresh(conn)
+    except Exception as e:
+        print(f"Error al actualizar los agregados: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"✓ aggregates/topic_daily/event_impact/sentiment_anomalies: {n} días recalculados "
+          f"en {time.perf_counter() - t0:.2f}s")
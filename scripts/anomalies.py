@@ -0,0 +1,128 @@
+# anomalies.py
+# Detección de picos de sentimiento y de volumen sobre la serie diaria de
+# 'aggregates', para proponer candidatos a 'events' sin revisar el gráfico a ojo.
+#
+# Por fuente (youtube, reddit, all) se siguen dos métricas diarias:
+#   neg_share  proporción de comentarios negativos (neg / total); sólo cuentan
+#              los días con al menos ANOMALY_MIN_POSTS comentarios
+#   volume     total de comentarios del día (los días sin datos valen 0)
+# Cada día se compara con la media y el desvío de los ANOMALY_WINDOW días
+# previos (z-score móvil, sin incluir el propio día). Si |z| >= ANOMALY_Z, el
+# día queda en 'sentiment_anomalies' como 'spike' (z > 0) o 'drop' (z < 0).
+#
+# Media y varianza móviles salen de sumas acumuladas de x, x² y de los días
+# válidos: los cinco años de serie se evalúan con unas pocas operaciones
+# vectorizadas, en milisegundos. aggregates.refresh_derived() llama a update()
+# una vez por corrida del pipeline con el primer día recalculado desde la
+# anterior, y sólo se reescriben las detecciones desde ese día: el z de un día
+# depende de él y de los anteriores.
+#
+# Uso:
+#   python anomalies.py                          # recalcula todo
+#   ANOMALY_Z=2.5 ANOMALY_WINDOW=14 python anomalies.py
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from event_impact import FIELDS, daily_counts
+from pipeline_db import DB_PATH, connect, ensure_schema
+
+WINDOW = int(os.getenv("ANOMALY_WINDOW", "28"))
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z", "3.0"))
+MIN_POSTS = int(os.getenv("ANOMALY_MIN_POSTS", "20"))
+MIN_DAYS = WINDOW // 2          # días válidos mínimos en la ventana previa
+
+# Desvío mínimo de la línea base por métrica: evita z enormes sobre una serie
+# casi plana (1 punto porcentual de proporción negativa, 1 comentario/día)
+MIN_STD = {"neg_share": 0.01, "volume": 1.0}
+
+
+def metrics(counts):
+    """{métrica: (valores diarios, máscara de días válidos)} de una fuente."""
+    neg, total = counts[:, FIELDS.index("neg")], counts[:, FIELDS.index("total")]
+    share = np.divide(neg, total, out=np.zeros(len(total)), where=total > 0)
+    return {
+        "neg_share": (share, total >= MIN_POSTS),
+        "volume": (total.astype(np.float64), np.ones(len(total), dtype=bool)),
+    }
+
+
+def rolling_zscore(x, valid, window=WINDOW, min_days=MIN_DAYS, min_std=0.0):
+    """
+    (z, media, desvío) de cada día contra los días válidos de [t - window, t).
+    NaN donde el día no es válido o la ventana tiene menos de min_days días.
+    """
+    x = np.where(valid, x, 0.0)
+
+    def prior(a):
+        acc = np.concatenate(([0.0], np.cumsum(a)))
+        t = np.arange(len(a))
+        return acc[t] - acc[np.maximum(t - window, 0)]
+
+    n = prior(valid.astype(np.float64))
+    ok = valid & (n >= min_days)
+    mean = np.divide(prior(x), n, out=np.full(len(x), np.nan), where=ok)
+    var = np.divide(prior(x * x), n, out=np.full(len(x), np.nan), where=ok) - mean ** 2
+    std = np.maximum(np.sqrt(np.maximum(var, 0.0)), min_std)
+    z = np.divide(x - mean, std, out=np.full(len(x), np.nan), where=ok & (std > 0))
+    return z, mean, std
+
+
+def detect(origin, daily, since=None, z_threshold=Z_THRESHOLD):
+    """Filas de 'sentiment_anomalies' de todas las fuentes y métricas, desde 'since' (date)."""
+    rows = []
+    for source, counts in daily.items():
+        days = np.datetime64(origin, "D") + np.arange(len(counts))
+        start = 0 if since is None else max((since - origin).days, 0)
+        total = counts[:, FIELDS.index("total")]
+        for metric, (x, valid) in metrics(counts).items():
+            z, mean, std = rolling_zscore(x, valid, min_std=MIN_STD[metric])
+            hits = np.flatnonzero(np.abs(np.nan_to_num(z[start:])) >= z_threshold) + start
+            for i in hits:
+                rows.append((source, metric, str(days[i]), round(float(x[i]), 4),
+                             round(float(mean[i]), 4), round(float(std[i]), 4),
+                             round(float(z[i]), 2), "spike" if z[i] > 0 else "drop",
+                             int(total[i])))
+    return rows
+
+
+def update(conn, since=None) -> int:
+    """
+    Reescribe las detecciones desde 'since' (date; None = todas). No hace
+    commit: aggregates.refresh_derived() la llama dentro de su transacción.
+    Devuelve las detecciones escritas.
+    """
+    if since is None:
+        conn.execute("DELETE FROM sentiment_anomalies")
+    else:
+        conn.execute("DELETE FROM sentiment_anomalies WHERE bucket_date >= ?", (since.isoformat(),))
+    origin, daily = daily_counts(conn)
+    if origin is None:
+        return 0
+    rows = detect(origin, daily, since)
+    conn.executemany("""
+        INSERT INTO sentiment_anomalies
+          (source, metric, bucket_date, value, baseline_mean, baseline_std, zscore,
+           direction, total_posts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        ensure_schema(conn)
+        t0 = time.perf_counter()
+        with conn:
+            n = update(conn)
+    except Exception as e:
+        print(f"Error al detectar anomalías: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"✓ sentiment_anomalies: {n} días anómalos (|z| >= {Z_THRESHOLD}, "
+          f"ventana {WINDOW} días) en {time.perf_counter() - t0:.3f}s")
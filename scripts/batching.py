@@ -0,0 +1,54 @@
+# batching.py
+# Lotes dinámicos por largo de texto para inferencia con transformers.
+#
+# Un lote se rellena (padding) hasta su texto más largo, así que mezclar un
+# comentario de 3 tokens con uno de 250 desperdicia casi todo el cómputo.
+# Aquí los textos se ordenan por cantidad de tokens y se agrupan según un
+# presupuesto de tokens (largo_máximo_del_lote × tamaño_del_lote): los lotes
+# de comentarios cortos llevan muchos textos y los de largos, pocos. Los
+# resultados se devuelven en el orden original.
+
+MAX_TOKENS_PER_BATCH = 8192   # presupuesto de tokens con padding por lote
+MAX_BATCH_SIZE = 256          # tope de textos por lote aunque sean muy cortos
+
+
+def token_lengths(tokenizer, texts, max_length):
+    """Cantidad de tokens de cada texto tras truncar a max_length."""
+    enc = tokenizer(texts, truncation=True, max_length=max_length)
+    return [len(ids) for ids in enc["input_ids"]]
+
+
+def token_budget_batches(lengths, max_tokens=MAX_TOKENS_PER_BATCH, max_batch=MAX_BATCH_SIZE):
+    """
+    Agrupa índices de textos ordenados por largo en lotes cuyo costo con
+    padding (largo_máximo × n) no supera max_tokens. Devuelve listas de índices.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    current, current_max = [], 0
+    for i in order:
+        new_max = max(current_max, lengths[i])
+        if current and (new_max * (len(current) + 1) > max_tokens or len(current) >= max_batch):
+            batches.append(current)
+            current, new_max = [], lengths[i]
+        current.append(i)
+        current_max = new_max
+    if current:
+        batches.append(current)
+    return batches
+
+
+def classify_bucketed(clf, texts, max_length, max_tokens=MAX_TOKENS_PER_BATCH, max_batch=MAX_BATCH_SIZE):
+    """
+    Ejecuta un pipeline de Hugging Face sobre 'texts' con lotes por presupuesto
+    de tokens y devuelve los resultados en el mismo orden que 'texts'.
+    """
+    if not texts:
+        return []
+    lengths = token_lengths(clf.tokenizer, texts, max_length)
+    results = [None] * len(texts)
+    for batch in token_budget_batches(lengths, max_tokens, max_batch):
+        outputs = clf([texts[i] for i in batch], batch_size=len(batch))
+        for i, out in zip(batch, outputs):
+            results[i] = out
+    return results
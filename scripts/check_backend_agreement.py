@@ -0,0 +1,80 @@
+# check_backend_agreement.py
+# Compara un backend de inferencia (int8 / onnx / onnx-int8) contra el modelo
+# fp32 de PyTorch sobre una muestra de posts: concordancia de etiquetas, matriz
+# de confusión, diferencia media del score y velocidad (posts/s) de cada uno.
+# Conviene correrlo antes de re-puntuar el corpus con un backend más rápido.
+#
+# Uso:
+#   SCORING_BACKEND=onnx-int8 SAMPLE_SIZE=2000 python check_backend_agreement.py
+
+import os
+import sys
+import time
+from contextlib import closing
+
+import numpy as np
+
+from batching import classify_bucketed
+from inference_backends import BACKENDS, build_classifier
+from pipeline_db import DB_PATH, SENTIMENT_MODEL, connect, sample_post_texts
+from inference_cache import normalize
+from score_all_roBERTa import MAX_LENGTH, MAX_TOKENS_PER_BATCH, norm_label
+
+CANDIDATE = os.getenv("SCORING_BACKEND", "onnx-int8")
+SAMPLE_SIZE = int(os.getenv("SAMPLE_SIZE", "2000"))
+SEED = int(os.getenv("SAMPLE_SEED", "42"))
+LABELS = ("neg", "neu", "pos")
+
+
+def run(backend: str, texts):
+    """Clasifica 'texts' con el backend; devuelve (etiquetas, scores, segundos)."""
+    clf = build_classifier(SENTIMENT_MODEL, backend, MAX_LENGTH)
+    classify_bucketed(clf, texts[:32], MAX_LENGTH, MAX_TOKENS_PER_BATCH)   # calentamiento
+    t0 = time.perf_counter()
+    out = classify_bucketed(clf, texts, MAX_LENGTH, MAX_TOKENS_PER_BATCH)
+    elapsed = time.perf_counter() - t0
+    labels = np.array([norm_label(r["label"]) for r in out])
+    scores = np.array([float(r["score"]) for r in out])
+    return labels, scores, elapsed
+
+
+def report(ref, cand, n: int):
+    ref_labels, ref_scores, ref_s = ref
+    cand_labels, cand_scores, cand_s = cand
+
+    print(f"\nMuestra: {n} posts")
+    print(f"  torch fp32 : {n / ref_s:8.1f} posts/s")
+    print(f"  {CANDIDATE:<10} : {n / cand_s:8.1f} posts/s  (x{ref_s / cand_s:.2f})")
+
+    agree = float((ref_labels == cand_labels).mean())
+    print(f"\nConcordancia de etiquetas: {agree:.2%} ({int((ref_labels != cand_labels).sum())} distintas)")
+    print(f"|Δ score| medio (mismo label): {np.abs(ref_scores - cand_scores)[ref_labels == cand_labels].mean():.4f}")
+
+    print("\nMatriz de confusión (filas = fp32, columnas = " + CANDIDATE + ")")
+    print("        " + "".join(f"{l:>8}" for l in LABELS))
+    for a in LABELS:
+        row = [int(((ref_labels == a) & (cand_labels == b)).sum()) for b in LABELS]
+        print(f"  {a:<6}" + "".join(f"{v:>8}" for v in row))
+
+    print("\nDistribución de etiquetas (fp32 -> " + CANDIDATE + ")")
+    for l in LABELS:
+        print(f"  {l}: {(ref_labels == l).mean():6.2%} -> {(cand_labels == l).mean():6.2%}")
+
+
+def main():
+    if CANDIDATE not in BACKENDS or CANDIDATE == "torch":
+        sys.exit(f"SCORING_BACKEND debe ser uno de: {', '.join(b for b in BACKENDS if b != 'torch')}")
+
+    with closing(connect()) as conn:
+        texts = [normalize(t) for t in sample_post_texts(conn, SAMPLE_SIZE, SEED)]
+    if not texts:
+        sys.exit(f"No hay posts con texto en {DB_PATH}")
+
+    print(f"Clasificando {len(texts)} posts con torch fp32 y {CANDIDATE}...")
+    ref = run("torch", texts)
+    cand = run(CANDIDATE, texts)
+    report(ref, cand, len(texts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# check_topic_agreement.py
+# Compara el motor de temáticas por embeddings contra el zero-shot de BART en
+# una muestra de posts: por tema, cuántos comentarios asigna cada motor con el
+# umbral UMBRAL_TEMAS, concordancia, precisión/recall/F1 (BART como referencia)
+# y velocidad. La velocidad mide sólo la inferencia: el modelo se carga y se
+# calienta con WARMUP textos antes de cronometrar, y no se usa la caché de
+# inferencias (un acierto de caché no es trabajo del motor).
+#
+# También ajusta la sigmoide coseno -> score del motor de embeddings contra los
+# scores de BART (regresión lineal del logit del score sobre el coseno) e
+# imprime los TOPIC_EMB_CENTRO / TOPIC_EMB_ESCALA resultantes.
+#
+# Uso:
+#   SAMPLE_SIZE=2000 python check_topic_agreement.py
+
+import os
+import sys
+import time
+from contextlib import closing
+
+import numpy as np
+
+from inference_cache import normalize
+from pipeline_db import DB_PATH, UMBRAL_TEMAS, connect, sample_post_texts
+from tematicas import tematicas_candidatas
+from topic_engines import EMB_CENTRO, EMB_ESCALA, build_engine
+
+SAMPLE_SIZE = int(os.getenv("SAMPLE_SIZE", "2000"))
+SEED = int(os.getenv("SAMPLE_SEED", "42"))
+WARMUP = int(os.getenv("WARMUP", "32"))   # textos clasificados antes de cronometrar
+
+
+def to_matrix(resultados) -> np.ndarray:
+    """Matriz (textos × temas) de scores, columnas en el orden de tematicas_candidatas."""
+    col = {t: j for j, t in enumerate(tematicas_candidatas)}
+    scores = np.zeros((len(resultados), len(col)))
+    for i, r in enumerate(resultados):
+        for label, score in zip(r['labels'], r['scores']):
+            scores[i, col[label]] = score
+    return scores
+
+
+def run(nombre: str, textos):
+    """(motor cargado, matriz de scores); imprime la velocidad de la inferencia sola."""
+    motor = build_engine(nombre, tematicas_candidatas)
+    motor.load()
+    motor.classify(textos[:WARMUP])     # primera pasada: kernels y memoria, fuera del tiempo
+
+    t0 = time.perf_counter()
+    resultados = motor.classify(textos)
+    elapsed = time.perf_counter() - t0
+    print(f"  {nombre:<10}: {len(textos)} textos en {elapsed:.1f}s "
+          f"({len(textos) / elapsed:.1f} textos/s)")
+    return motor, to_matrix(resultados)
+
+
+def calibrate(ref, sims):
+    """
+    (CENTRO, ESCALA) tales que sigmoide((coseno - CENTRO) * ESCALA) aproxima el
+    score de BART: ajuste lineal logit(score) = ESCALA * coseno - ESCALA * CENTRO
+    sobre todos los pares post×tema. None si la pendiente no es positiva.
+    """
+    p = np.clip(ref.ravel(), 1e-4, 1 - 1e-4)
+    escala, corte = np.polyfit(sims.ravel(), np.log(p / (1 - p)), 1)
+    if escala <= 0:
+        return None
+    return -corte / escala, escala
+
+
+def report(ref, cand):
+    ref_on, cand_on = ref > UMBRAL_TEMAS, cand > UMBRAL_TEMAS
+    n = len(ref)
+
+    print(f"\nPor tema (umbral {UMBRAL_TEMAS:.2f}, referencia = zero-shot):")
+    print(f"  {'tema':25s} {'BART':>6} {'emb':>6} {'concord.':>9} {'prec.':>7} {'recall':>7} {'F1':>6}")
+    for j, tema in enumerate(tematicas_candidatas):
+        a, b = ref_on[:, j], cand_on[:, j]
+        tp = int((a & b).sum())
+        prec = tp / b.sum() if b.sum() else 0.0
+        rec = tp / a.sum() if a.sum() else 0.0
+        f1 = 2 * prec * rec / (prec + rec) if prec + rec else 0.0
+        print(f"  {tema:25s} {int(a.sum()):6d} {int(b.sum()):6d} {(a == b).mean():9.2%} {prec:7.2f} {rec:7.2f} {f1:6.2f}")
+
+    exact = (ref_on == cand_on).all(axis=1).mean()
+    corr = np.corrcoef(ref.ravel(), cand.ravel())[0, 1]
+    print(f"\nMismo conjunto de temas en {exact:.2%} de {n} comentarios")
+    print(f"Correlación de scores (todos los pares post×tema): {corr:.3f}")
+
+
+def report_calibration(ref, sims):
+    ajuste = calibrate(ref, sims)
+    print(f"\nCalibración coseno -> score (actual: CENTRO={EMB_CENTRO:g}, ESCALA={EMB_ESCALA:g}):")
+    if ajuste is None:
+        print("  Sin ajuste: el coseno no crece con el score de BART en esta muestra")
+        return
+    centro, escala = ajuste
+    fit = 1.0 / (1.0 + np.exp(-(sims - centro) * escala))
+    exact = ((ref > UMBRAL_TEMAS) == (fit > UMBRAL_TEMAS)).all(axis=1).mean()
+    print(f"  TOPIC_EMB_CENTRO={centro:.3f} TOPIC_EMB_ESCALA={escala:.2f} "
+          f"(mismo conjunto de temas en {exact:.2%} con el ajuste)")
+
+
+def main():
+    with closing(connect()) as conn:
+        textos = [normalize(t) for t in sample_post_texts(conn, SAMPLE_SIZE, SEED)]
+    if not textos:
+        sys.exit(f"No hay posts con texto en {DB_PATH}")
+
+    print(f"Clasificando {len(textos)} posts con ambos motores (sin caché)...")
+    _, ref = run("zero-shot", textos)
+    motor, cand = run("embeddings", textos)
+    report(ref, cand)
+    report_calibration(ref, motor.similarities(textos))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# event_impact.py
+# Impacto de cada evento de la tabla 'events' sobre el sentimiento, precalculado
+# en 'event_impact' para que el panel de eventos lo lea con una sola consulta.
+#
+# Para cada evento (fecha d), cada ventana de W días (EVENT_WINDOWS) y cada
+# fuente (youtube, reddit, all):
+#   antes       [d - W, d - 1]    pos/neu/neg/total y sentimiento neto
+#   después     [d, d + W - 1]    ídem: W días contando el del evento (el
+#               comparador anterior sumaba [d, d + 30], 31 días, así que sus
+#               totales de 30 días eran un día más largos que los de esta tabla)
+#   línea base  los EVENT_BASELINE_DAYS días previos a 'antes' (móvil: se
+#               desplaza con cada evento)
+#   delta_net   neto después - neto de la línea base, con neto = (pos - neg) / total
+#   volume_lift comentarios por día después / comentarios por día en la línea base
+#   top_topics  los EVENT_TOP_TOPICS temas con más comentarios después del
+#               evento (de topic_daily, todas las fuentes) y su proporción negativa
+#
+# Las sumas salen de la serie diaria de 'aggregates' con sumas acumuladas:
+# todas las ventanas de todos los eventos son restas vectorizadas. Los días
+# sin datos cuentan como 0 y las ventanas se recortan al rango con datos.
+# aggregates.refresh_derived() llama a rebuild() una vez por corrida del
+# pipeline, cuando cambiaron los agregados, o si cambiaron las filas de 'events'.
+#
+# Uso:
+#   python event_impact.py
+#   EVENT_WINDOWS=7,30,90 EVENT_BASELINE_DAYS=60 python event_impact.py
+
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from pipeline_db import DB_PATH, connect, ensure_schema, table_exists
+
+WINDOWS = tuple(int(w) for w in os.getenv("EVENT_WINDOWS", "7,30").split(","))
+BASELINE_DAYS = int(os.getenv("EVENT_BASELINE_DAYS", "90"))
+TOP_TOPICS = int(os.getenv("EVENT_TOP_TOPICS", "5"))
+
+SOURCES = ("youtube", "reddit", "all")
+FIELDS = ("pos", "neu", "neg", "total")
+
+# Columnas numéricas de 'event_impact' que calcula window_stats()
+COLUMNS = (
+    "before_pos", "before_neu", "before_neg", "before_total",
+    "after_pos", "after_neu", "after_neg", "after_total",
+    "baseline_total", "baseline_days",
+    "before_net", "after_net", "baseline_net", "delta_net", "volume_lift",
+)
+
+
+def daily_counts(conn):
+    """
+    Serie diaria densa de 'aggregates': (primer día, {fuente: array (n_días, FIELDS)}).
+    Los días sin fila valen 0; 'all' se arma sumando las fuentes si no está.
+    """
+    rows = conn.execute("""
+        SELECT source, bucket_date, pos, neu, neg, total_posts
+        FROM aggregates WHERE granularity = 'day'
+    """).fetchall()
+    if not rows:
+        return None, {}
+    days = np.array([r[1][:10] for r in rows], dtype="datetime64[D]")
+    origin = days.min()
+    offsets = (days - origin).astype(np.int64)
+    values = np.array([r[2:] for r in rows], dtype=np.int64)
+    sources = np.array([r[0] for r in rows])
+
+    daily = {}
+    for source in np.unique(sources):
+        mask = sources == source
+        arr = np.zeros((int(offsets.max()) + 1, len(FIELDS)), dtype=np.int64)
+        np.add.at(arr, offsets[mask], values[mask])
+        daily[str(source)] = arr
+    if "all" not in daily:
+        daily["all"] = sum(daily.values())
+    return origin.astype(object), daily
+
+
+def load_events(conn):
+    """[(event_id, fecha, título, tag)] de 'events' con fecha válida, por fecha."""
+    if not table_exists(conn, "events"):
+        return []
+    events = []
+    for rowid, day, title, tag in conn.execute(
+        "SELECT rowid, date, description, tag FROM events ORDER BY date, rowid"
+    ):
+        try:
+            events.append((rowid, date.fromisoformat(str(day)[:10]), title, tag))
+        except ValueError:
+            continue
+    return events
+
+
+def _net(pos, neg, total):
+    """(pos - neg) / total por elemento; NaN donde no hay comentarios."""
+    return np.divide(pos - neg, total, out=np.full(len(total), np.nan), where=total > 0)
+
+
+def window_stats(daily, offsets, window, baseline_days=BASELINE_DAYS):
+    """
+    Sumas de las ventanas antes/después/línea base de todos los eventos
+    ('offsets' = días desde el inicio de 'daily') para una fuente: {columna: array por evento}.
+    """
+    n = len(daily)
+    acc = np.zeros((n + 1, len(FIELDS)), dtype=np.int64)
+    np.cumsum(daily, axis=0, out=acc[1:])
+
+    def span(lo, hi):
+        lo, hi = np.clip(lo, 0, n), np.clip(hi, 0, n)
+        hi = np.maximum(hi, lo)
+        return acc[hi] - acc[lo], hi - lo
+
+    before, _ = span(offsets - window, offsets)
+    after, after_days = span(offsets, offsets + window)
+    base, base_days = span(offsets - window - baseline_days, offsets - window)
+
+    pos, neu, neg, total = range(len(FIELDS))
+    stats = {f"before_{f}": before[:, i] for i, f in enumerate(FIELDS)}
+    stats.update({f"after_{f}": after[:, i] for i, f in enumerate(FIELDS)})
+    stats["baseline_total"] = base[:, total]
+    stats["baseline_days"] = base_days
+    stats["before_net"] = _net(before[:, pos], before[:, neg], before[:, total])
+    stats["after_net"] = _net(after[:, pos], after[:, neg], after[:, total])
+    stats["baseline_net"] = _net(base[:, pos], base[:, neg], base[:, total])
+    stats["delta_net"] = stats["after_net"] - stats["baseline_net"]
+
+    after_rate = np.divide(after[:, total], after_days, out=np.full(len(offsets), np.nan),
+                           where=after_days > 0)
+    base_rate = np.divide(base[:, total], base_days, out=np.full(len(offsets), np.nan),
+                          where=base_days > 0)
+    stats["volume_lift"] = np.divide(after_rate, base_rate, out=np.full(len(offsets), np.nan),
+                                     where=base_rate > 0)
+    return stats
+
+
+def top_topics(conn, start: date, window: int, limit: int = TOP_TOPICS) -> list:
+    """Temas con más comentarios en [start, start + window) y su proporción negativa."""
+    rows = conn.execute("""
+        SELECT topic, SUM(total_posts) AS total,
+               SUM(CASE WHEN sentiment_label = 'neg' THEN total_posts ELSE 0 END) AS neg
+        FROM topic_daily
+        WHERE bucket_date >= ? AND bucket_date < ?
+        GROUP BY topic
+        ORDER BY total DESC, topic
+        LIMIT ?
+    """, (start.isoformat(), (start + timedelta(days=window)).isoformat(), limit)).fetchall()
+    return [{"topic": t, "total": total, "neg_share": round(neg / total, 4)} for t, total, neg in rows]
+
+
+def _value(v):
+    """Escalar de NumPy -> valor para SQLite (NaN -> NULL)."""
+    if isinstance(v, (float, np.floating)):
+        return None if np.isnan(v) else round(float(v), 4)
+    return int(v)
+
+
+def rebuild(conn, windows=WINDOWS) -> int:
+    """
+    Recalcula 'event_impact' completa. No hace commit: aggregates.refresh_derived()
+    la llama dentro de su transacción. Devuelve las filas escritas.
+    """
+    conn.execute("DELETE FROM event_impact")
+    events = load_events(conn)
+    if not events:
+        return 0
+    origin, daily = daily_counts(conn)
+    if origin is None:
+        # Sin agregados igual se guardan los eventos (totales en 0, netos NULL),
+        # así events_changed() tiene contra qué comparar
+        origin, daily = events[0][1], {"all": np.zeros((0, len(FIELDS)), dtype=np.int64)}
+
+    offsets = np.array([(day - origin).days for _, day, _, _ in events], dtype=np.int64)
+    topics = {(day, w): json.dumps(top_topics(conn, day, w), ensure_ascii=False)
+              for _, day, _, _ in events for w in windows}
+
+    marks = ", ".join("?" * (len(COLUMNS) + 7))
+    sql = f"""
+        INSERT INTO event_impact
+          (source, window_days, event_id, event_date, title, tag, {', '.join(COLUMNS)}, top_topics)
+        VALUES ({marks})
+    """
+    rows = []
+    for source in SOURCES:
+        if source not in daily:
+            continue
+        for w in windows:
+            stats = window_stats(daily[source], offsets, w)
+            for i, (event_id, day, title, tag) in enumerate(events):
+                rows.append((source, w, event_id, day.isoformat(), title, tag,
+                             *(_value(stats[c][i]) for c in COLUMNS), topics[(day, w)]))
+    conn.executemany(sql, rows)
+    return len(rows)
+
+
+def events_changed(conn) -> bool:
+    """¿Las filas de 'events' difieren de las que se usaron para calcular 'event_impact'?"""
+    current = {(rowid, day.isoformat(), title, tag) for rowid, day, title, tag in load_events(conn)}
+    stored = set(conn.execute("SELECT DISTINCT event_id, event_date, title, tag FROM event_impact"))
+    return current != stored
+
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        ensure_schema(conn)
+        t0 = time.perf_counter()
+        with conn:
+            n = rebuild(conn)
+    except Exception as e:
+        print(f"Error al calcular event_impact: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"✓ event_impact: {n} filas (evento × ventana {WINDOWS} × fuente) "
+          f"en {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,153 @@
+# export_parquet.py
+# Exporta posts, scores, post_topics (con el nombre del tema) y aggregates a
+# Parquet particionado por fuente y mes (formato en parquet_store.py), para
+# análisis sobre todo el corpus sin pasar fila a fila por SQLite.
+#
+# Cada partición se lee con un rango sobre created_at (idx_posts_source_created),
+# se arma en columnas de Arrow y se escribe con zstd; la memoria queda acotada
+# por el mes más grande. Cada dataset se escribe en un directorio temporal y
+# reemplaza al anterior al final, así un lector nunca ve una exportación a medias.
+#
+# Uso:
+#   python export_parquet.py                  # todos los datasets
+#   python export_parquet.py scores posts     # sólo esos
+#   PARQUET_DIR=/ruta python export_parquet.py
+
+import os
+import shutil
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import aggregates
+from parquet_store import LABEL, PARQUET_DIR, SCHEMAS, TIME_COLUMN, path
+from pipeline_db import DB_PATH, connect
+
+ROW_GROUP_ROWS = 128_000
+
+# SELECT de cada dataset por partición; las columnas siguen el orden de SCHEMAS
+QUERIES = {
+    "posts": """
+        SELECT p.post_id, p.root_id, p.parent_id, p.created_at, p.author, p.text,
+               p.like_count, p.reply_count, p.score, p.url
+        FROM posts AS p
+        WHERE p.source = ? AND p.created_at >= ? AND p.created_at < ?
+    """,
+    "scores": """
+        SELECT s.post_id, p.created_at, s.model_name, s.sentiment_label, s.sentiment_score
+        FROM posts AS p
+        CROSS JOIN scores AS s ON s.post_id = p.post_id
+        WHERE p.source = ? AND p.created_at >= ? AND p.created_at < ?
+    """,
+    "post_topics": """
+        SELECT pt.post_id, p.created_at, t.name, pt.score
+        FROM posts AS p
+        CROSS JOIN post_topics AS pt ON pt.post_id = p.post_id
+        INNER JOIN topics AS t ON t.topic_id = pt.topic_id
+        WHERE p.source = ? AND p.created_at >= ? AND p.created_at < ?
+    """,
+    "aggregates": """
+        SELECT bucket_date, granularity, pos, neu, neg, total_posts, total_interactions
+        FROM aggregates
+        WHERE source = ?
+    """,
+}
+
+
+def month_partitions(conn):
+    """[(source, 'YYYY-MM', desde, hasta)] con los meses que tienen posts."""
+    parts = []
+    for source, month in conn.execute(
+        "SELECT DISTINCT source, substr(created_at, 1, 7) FROM posts ORDER BY 1, 2"
+    ):
+        y, m = int(month[:4]), int(month[5:7])
+        nxt = date(y + m // 12, m % 12 + 1, 1)
+        parts.append((source, month, f"{month}-01", nxt.isoformat()))
+    return parts
+
+
+def to_column(values, field: pa.Field) -> pa.Array:
+    """Columna de Arrow con el tipo del esquema a partir de valores de SQLite."""
+    if pa.types.is_timestamp(field.type):
+        parsed = pd.to_datetime(pd.Series(values, dtype="object"), utc=True, format="ISO8601")
+        return pa.Array.from_pandas(parsed, type=field.type)
+    if pa.types.is_date32(field.type):
+        text = pa.array(values, pa.string())
+        return pc.cast(pc.strptime(pc.utf8_slice_codeunits(text, 0, 10), "%Y-%m-%d", "s"), pa.date32())
+    if pa.types.is_dictionary(field.type):
+        return pa.array(values, pa.string()).dictionary_encode().cast(LABEL)
+    return pa.array(values, field.type)
+
+
+def to_table(rows, schema: pa.Schema) -> pa.Table:
+    columns = list(zip(*rows))
+    return pa.Table.from_arrays([to_column(c, f) for c, f in zip(columns, schema)], schema=schema)
+
+
+def write_partition(rows, schema, directory) -> int:
+    os.makedirs(directory, exist_ok=True)
+    pq.write_table(to_table(rows, schema), os.path.join(directory, "part-0.parquet"),
+                   compression="zstd", row_group_size=ROW_GROUP_ROWS)
+    return len(rows)
+
+
+def export(conn, name: str, base: str = PARQUET_DIR) -> int:
+    """Exporta un dataset completo (reemplazando el anterior). Devuelve filas escritas."""
+    final = path(name, base)
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    schema, sql = SCHEMAS[name], QUERIES[name]
+
+    total = 0
+    if TIME_COLUMN[name][1]:
+        for source, month, lo, hi in month_partitions(conn):
+            rows = conn.execute(sql, (source, lo, hi)).fetchall()
+            if rows:
+                total += write_partition(rows, schema, os.path.join(tmp, f"source={source}", f"month={month}"))
+    else:
+        sources = [r[0] for r in conn.execute(f"SELECT DISTINCT source FROM {name}")]
+        for source in sources:
+            rows = conn.execute(sql, (source,)).fetchall()
+            if rows:
+                total += write_partition(rows, schema, os.path.join(tmp, f"source={source}"))
+    os.makedirs(tmp, exist_ok=True)
+
+    old = final + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.isdir(final):
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+    return total
+
+
+def _size_mb(directory) -> float:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(directory) for f in files) / 1e6
+
+
+def main():
+    names = sys.argv[1:] or list(QUERIES)
+    unknown = [n for n in names if n not in QUERIES]
+    if unknown:
+        sys.exit(f"Datasets desconocidos: {', '.join(unknown)} (opciones: {', '.join(QUERIES)})")
+
+    conn = connect(DB_PATH)
+    try:
+        aggregates.refresh(conn)      # que 'aggregates' no tenga días pendientes
+        print(f"Exportando {DB_PATH} -> {PARQUET_DIR}")
+        for name in names:
+            t0 = time.perf_counter()
+            n = export(conn, name)
+            print(f"  ✓ {name:12s} {n:>9} filas  {_size_mb(path(name)):7.1f} MB  "
+                  f"{time.perf_counter() - t0:5.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# inference_backends.py
+# Backends de inferencia para el modelo de sentimiento (clasificación de secuencias).
+#
+#   torch      fp32 en PyTorch (GPU si hay, si no CPU); el comportamiento original
+#   int8       cuantización dinámica int8 de las capas Linear en PyTorch (CPU)
+#   onnx       modelo exportado a ONNX y ejecutado con onnxruntime (CPU)
+#   onnx-int8  el export ONNX con pesos cuantizados a int8 por onnxruntime
+#
+# Los exports ONNX (fp32 e int8) se generan una sola vez y quedan en
+# MODELS_DIR/<modelo>/; las corridas siguientes los cargan directo del disco.
+# La cuantización 'int8' de PyTorch se aplica en memoria al cargar (tarda segundos).
+# Todos los backends devuelven un objeto con '.tokenizer' y que se llama como un
+# pipeline de Hugging Face (clf(textos, batch_size=n) -> [{label, score}]), así
+# classify_bucketed() funciona igual con cualquiera.
+
+import os
+
+import numpy as np
+import torch
+from transformers import (
+    AutoConfig, AutoModelForSequenceClassification, AutoTokenizer, TextClassificationPipeline,
+)
+
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+MODELS_DIR = os.getenv(
+    "MODELS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models"),
+)
+ONNX_OPSET = 17
+
+
+def artifact_dir(model_name: str) -> str:
+    """Carpeta de artefactos de un modelo ('org/modelo' -> 'org--modelo')."""
+    path = os.path.join(MODELS_DIR, model_name.replace("/", "--"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def scores_model_name(model_name: str, backend: str) -> str:
+    """
+    Nombre con el que se guardan los scores. El fp32 conserva el nombre del
+    modelo; los demás backends se guardan aparte ('modelo+int8') para poder
+    medir la deriva de etiquetas antes de reemplazar los scores originales.
+    """
+    return model_name if backend == "torch" else f"{model_name}+{backend}"
+
+
+# ---------- PyTorch ----------
+def _torch_pipeline(model, tokenizer, device, max_length):
+    return TextClassificationPipeline(
+        model=model,
+        tokenizer=tokenizer,
+        device=device,               # 0 = GPU, -1 = CPU
+        truncation=True,
+        max_length=max_length,
+    )
+
+
+def _quantized_torch_model(model_name: str):
+    """Modelo con las capas Linear cuantizadas a int8 (pesos int8, activaciones dinámicas)."""
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+# ---------- ONNX Runtime ----------
+class OnnxClassifier:
+    """Clasificador sobre una sesión de onnxruntime con la interfaz de un pipeline HF."""
+
+    def __init__(self, session, tokenizer, id2label, max_length):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.id2label = id2label
+        self.max_length = max_length
+        self.input_names = [i.name for i in session.get_inputs()]
+
+    def __call__(self, texts, batch_size=None):
+        batch_size = batch_size or len(texts)
+        out = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True, truncation=True, max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {name: enc[name].astype(np.int64) for name in self.input_names}
+            logits = self.session.run(None, feeds)[0]
+            probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+            for row in probs:
+                k = int(row.argmax())
+                out.append({"label": self.id2label[k], "score": float(row[k])})
+        return out
+
+
+def export_onnx(model_name: str, quantize: bool = False) -> str:
+    """Exporta el modelo a ONNX (y opcionalmente a int8) si aún no existe; devuelve la ruta."""
+    base = os.path.join(artifact_dir(model_name), "model.onnx")
+    if not os.path.exists(base):
+        print(f"Exportando {model_name} a ONNX (una sola vez) -> {base}")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        dummy = tokenizer(["texto de ejemplo"], return_tensors="pt")
+        axes = {0: "batch", 1: "seq"}
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            base,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "logits": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+    if not quantize:
+        return base
+
+    quantized = os.path.join(artifact_dir(model_name), "model.int8.onnx")
+    if not os.path.exists(quantized):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print(f"Cuantizando ONNX a int8 -> {quantized}")
+        quantize_dynamic(base, quantized, weight_type=QuantType.QInt8)
+    return quantized
+
+
+def _onnx_classifier(model_name: str, quantize: bool, max_length: int, threads: int):
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise SystemExit("El backend ONNX requiere 'onnxruntime' (pip install onnxruntime onnx).") from e
+
+    path = export_onnx(model_name, quantize)
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        opts.intra_op_num_threads = threads
+    session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    id2label = AutoConfig.from_pretrained(model_name).id2label
+    return OnnxClassifier(session, tokenizer, id2label, max_length)
+
+
+# ---------- selección ----------
+def build_classifier(model_name: str, backend: str = "torch", max_length: int = 256,
+                     device: int = -1, threads: int = 0):
+    """
+    Construye el clasificador del backend pedido. 'device' sólo aplica a 'torch';
+    los backends cuantizados/ONNX corren en CPU. 'threads' (0 = por defecto)
+    fija los hilos de onnxruntime.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend!r} (opciones: {', '.join(BACKENDS)})")
+
+    if backend == "torch":
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        return _torch_pipeline(model, tokenizer, device, max_length)
+    if backend == "int8":
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        return _torch_pipeline(_quantized_torch_model(model_name), tokenizer, -1, max_length)
+    return _onnx_classifier(model_name, backend == "onnx-int8", max_length, threads)
@@ -0,0 +1,105 @@
+# inference_cache.py
+# Caché persistente de inferencias por contenido (tabla 'inference_cache').
+#
+# Los comentarios de YouTube repiten mucho el mismo texto ("W", "🔥🔥🔥", spam
+# copiado). La clave es (modelo, xxh3_128 del texto normalizado): cada texto
+# distinto se clasifica una sola vez por modelo, también entre corridas y tras
+# una caída. Sirve para cualquier salida JSON (sentimiento o zero-shot).
+#
+# normalize() es la única limpieza de texto del pipeline: el scoring y las
+# temáticas clasifican (y guardan en caché) exactamente el mismo texto.
+
+import json
+import re
+
+import xxhash
+
+LOOKUP_CHUNK = 500   # hashes por consulta IN (...)
+MAX_CHARS = 1200     # recorte duro por seguridad (los modelos truncan antes)
+
+
+def normalize(text: str) -> str:
+    """Texto que se clasifica y que define la clave de caché."""
+    if text is None:
+        return ""
+    s = re.sub(r"http\S+", " ", text)         # URLs fuera
+    s = re.sub(r"@\w+", "@user", s)           # menciones
+    s = re.sub(r"#(\w+)", r"\1", s)           # hashtags -> palabra
+    s = re.sub(r"\s+", " ", s).strip()
+    return s[:MAX_CHARS]
+
+
+def text_hash(text: str) -> bytes:
+    """Hash de 128 bits del texto (se guarda como BLOB de 16 bytes)."""
+    return xxhash.xxh3_128_digest(text.encode("utf-8"))
+
+
+def model_key(*parts) -> str:
+    """
+    Clave de modelo para la caché. Las partes que cambian la salida además del
+    nombre (p.ej. el conjunto de etiquetas zero-shot) se resumen en un hash corto.
+    """
+    name, *rest = parts
+    if not rest:
+        return name
+    extra = json.dumps(rest, ensure_ascii=False).encode("utf-8")
+    return f"{name}@{xxhash.xxh64_hexdigest(extra)}"
+
+
+def lookup(conn, model: str, hashes) -> dict:
+    """Devuelve {hash: resultado} para los hashes ya presentes en la caché."""
+    hashes = list(dict.fromkeys(hashes))
+    found = {}
+    for start in range(0, len(hashes), LOOKUP_CHUNK):
+        chunk = hashes[start:start + LOOKUP_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT text_hash, result_json FROM inference_cache "
+            f"WHERE model_name = ? AND text_hash IN ({marks})",
+            (model, *chunk),
+        )
+        found.update((bytes(h), json.loads(r)) for h, r in rows)
+    return found
+
+
+def store(conn, model: str, entries) -> None:
+    """Guarda [(hash, resultado)] sin pisar lo existente. El commit lo hace quien llama."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO inference_cache (model_name, text_hash, result_json) VALUES (?,?,?)",
+        ((model, h, json.dumps(r, ensure_ascii=False)) for h, r in entries),
+    )
+
+
+def split_cached(hashes, known: dict):
+    """
+    Índices a clasificar: uno por cada hash que no está en 'known', deduplicando
+    dentro de la misma tanda (el primer texto de cada hash es el representante).
+    """
+    seen = set()
+    todo = []
+    for i, h in enumerate(hashes):
+        if h not in known and h not in seen:
+            seen.add(h)
+            todo.append(i)
+    return todo
+
+
+def classify_cached(conn, model: str, texts, classify):
+    """
+    Clasifica 'texts' usando la caché: consulta, corre 'classify' sólo sobre los
+    textos únicos que faltan, guarda los nuevos y devuelve los resultados en el
+    orden de 'texts'. Devuelve también cuántos textos se resolvieron sin modelo.
+    """
+    hashes = [text_hash(t) for t in texts]
+    known = lookup(conn, model, hashes)
+    todo = split_cached(hashes, known)
+
+    if todo:
+        outputs = classify([texts[i] for i in todo])
+        if isinstance(outputs, dict):          # algunos pipelines no envuelven 1 resultado
+            outputs = [outputs]
+        new = [(hashes[i], out) for i, out in zip(todo, outputs)]
+        store(conn, model, new)
+        known.update(new)
+
+    return [known[h] for h in hashes], len(texts) - len(todo)
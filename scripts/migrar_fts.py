@@ -0,0 +1,63 @@
+# migrar_fts.py
+# Crea el índice FTS5 'posts_fts' sobre posts.text (lo usa /comments?q= de la
+# API) y lo llena con los posts existentes. Desde ahí los triggers de
+# pipeline_db.FTS_SCHEMA lo mantienen al insertar, borrar o editar posts.
+#
+# 'posts' no tiene INTEGER PRIMARY KEY, así que un VACUUM puede renumerar los
+# rowid: después de un VACUUM hay que correr esto con --rebuild, que además
+# borra las marcas por rowid del scoring y de tematicas.py (la próxima corrida
+# de cada uno revisa todo 'posts' y re-usa la caché de inferencias).
+#
+# Uso:
+#   python migrar_fts.py              # crea y llena el índice (si no existe)
+#   python migrar_fts.py --rebuild    # lo reconstruye desde 'posts'
+
+import sys
+import time
+
+from pipeline_db import DB_PATH, FTS_SCHEMA, SCORING_CURSOR, TOPICS_CURSOR, connect, table_exists
+
+
+def build_fts(conn, rebuild=False) -> int:
+    """Crea 'posts_fts' y sus triggers; lo llena si es nuevo o con 'rebuild'. Devuelve posts indexados."""
+    existed = table_exists(conn, "posts_fts")
+    with conn:
+        conn.executescript(FTS_SCHEMA)
+    if existed and not rebuild:
+        return 0
+    with conn:
+        conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('optimize')")
+    return conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+
+def clear_rowid_cursors(conn) -> int:
+    """Borra las marcas por rowid (scoring y temáticas, de todos los modelos). Devuelve cuántas."""
+    if not table_exists(conn, "fetch_cursors"):
+        return 0
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM fetch_cursors WHERE (source, entity_type) IN ((?, ?), (?, ?))",
+            (*SCORING_CURSOR, *TOPICS_CURSOR),
+        )
+    return cur.rowcount
+
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        t0 = time.perf_counter()
+        rebuild = "--rebuild" in sys.argv
+        n = build_fts(conn, rebuild=rebuild)
+        marcas = clear_rowid_cursors(conn) if rebuild else 0
+    except Exception as e:
+        print(f"Error al crear el índice de texto: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    if n:
+        print(f"✓ posts_fts: {n} posts indexados en {time.perf_counter() - t0:.1f}s")
+    else:
+        print("✓ posts_fts ya existía (usa --rebuild para reconstruirlo)")
+    if marcas:
+        print(f"✓ {marcas} marcas de scoring/temáticas borradas (los rowid pudieron cambiar)")
@@ -0,0 +1,29 @@
+# migrar_indices.py
+# Crea los índices que usan las consultas de la API (pipeline_db.API_INDEXES)
+# y actualiza las estadísticas del planificador (ANALYZE), para que cada
+# consulta sea una búsqueda por rango en un índice y no un recorrido completo.
+# Idempotente: los índices existentes se dejan como están.
+#
+# Para verificar los planes después: python ../backend/check_query_plans.py
+#
+# Uso:
+#   python migrar_indices.py
+
+import sys
+import time
+
+from pipeline_db import API_INDEXES, DB_PATH, connect
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        t0 = time.perf_counter()
+        conn.executescript(API_INDEXES)
+        conn.execute("ANALYZE")
+        conn.commit()
+    except Exception as e:
+        print(f"Error al crear los índices: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"✓ Índices de la API creados y estadísticas actualizadas en {time.perf_counter() - t0:.1f}s")
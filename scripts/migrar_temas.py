@@ -0,0 +1,78 @@
+# migrar_temas.py
+# Migración única: convierte 'datos_finales_con_temas' (lista de temas guardada
+# como texto, p.ej. "['Música', 'Política']") a las tablas normalizadas
+# 'topics' + 'post_topics'. Recorre la tabla antigua por tandas de rowid, así
+# que la memoria no crece con el tamaño del corpus.
+#
+# Uso:
+#   python migrar_temas.py            # migra y reconstruye topic_daily
+#   python migrar_temas.py --drop     # además elimina la tabla antigua
+
+import ast
+import sys
+
+from tqdm import tqdm
+
+from pipeline_db import DB_PATH, connect, ensure_schema, table_exists, topic_ids
+from rollups import build_topic_rollup
+
+TABLA_ANTIGUA = "datos_finales_con_temas"
+CHUNK_ROWS = 5_000
+
+
+def migrate(conn) -> int:
+    """Copia los temas de la tabla antigua a 'post_topics'. Devuelve filas insertadas."""
+    ensure_schema(conn)
+    total = conn.execute(f"SELECT COUNT(*) FROM {TABLA_ANTIGUA}").fetchone()[0]
+    pbar = tqdm(total=total, unit="post")
+
+    last_rowid = 0
+    inserted = 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT rowid, post_id, tematicas
+            FROM {TABLA_ANTIGUA}
+            WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+        """, (last_rowid, CHUNK_ROWS)).fetchall()
+        if not rows:
+            break
+
+        parsed = [(pid, ast.literal_eval(temas) if temas else []) for _, pid, temas in rows]
+        ids = topic_ids(conn, [t for _, temas in parsed for t in temas if t])
+
+        # OR IGNORE: si el post ya fue clasificado con scores reales, no los pisamos
+        cur = conn.executemany(
+            "INSERT OR IGNORE INTO post_topics (post_id, topic_id, score) VALUES (?,?,NULL)",
+            [(pid, ids[t]) for pid, temas in parsed for t in temas if t],
+        )
+        conn.commit()
+
+        inserted += cur.rowcount
+        last_rowid = rows[-1][0]
+        pbar.update(len(rows))
+
+    pbar.close()
+    return inserted
+
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        if not table_exists(conn, TABLA_ANTIGUA):
+            print(f"No existe la tabla '{TABLA_ANTIGUA}', nada que migrar.")
+            sys.exit(0)
+
+        n = migrate(conn)
+        print(f"✓ {n} asignaciones post→tema migradas a 'post_topics'")
+
+        n_rollup = build_topic_rollup(conn)
+        print(f"✓ topic_daily reconstruida ({n_rollup} filas)")
+
+        if "--drop" in sys.argv:
+            conn.execute(f"DROP TABLE {TABLA_ANTIGUA}")
+            conn.commit()
+            print(f"✓ Tabla '{TABLA_ANTIGUA}' eliminada")
+    finally:
+        conn.close()
@@ -0,0 +1,144 @@
+# parquet_store.py
+# Copia columnar de la DB para análisis sobre todo el corpus (la escribe
+# export_parquet.py). Cada tabla es un dataset Parquet particionado al estilo
+# Hive por fuente y mes:
+#
+#   PARQUET_DIR/posts/source=youtube/month=2024-01/part-0.parquet
+#   PARQUET_DIR/scores/...   PARQUET_DIR/post_topics/...   (mismas particiones)
+#   PARQUET_DIR/aggregates/source=all/part-0.parquet
+#
+# Las etiquetas (fuente, sentimiento, modelo, tema, granularidad) van
+# codificadas como diccionario, así que se leen como 'category' en pandas.
+# scores y post_topics repiten created_at del post para filtrar por fecha sin
+# JOIN. load() lee sólo las columnas pedidas y empuja los filtros de fuente y
+# fecha a las particiones (directorios que ni se abren) y a las estadísticas
+# de cada row group.
+#
+# Uso:
+#   from parquet_store import load
+#   df = load("scores", columns=["created_at", "sentiment_label"],
+#             source="youtube", desde="2023-01-01", hasta="2023-12-31").to_pandas()
+
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+PARQUET_DIR = os.getenv(
+    "PARQUET_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "parquet"),
+)
+
+LABEL = pa.dictionary(pa.int8(), pa.string())
+TIMESTAMP = pa.timestamp("ms", tz="UTC")
+
+# Esquema de cada dataset (sin las columnas de partición)
+SCHEMAS = {
+    "posts": pa.schema([
+        ("post_id", pa.string()), ("root_id", pa.string()), ("parent_id", pa.string()),
+        ("created_at", TIMESTAMP), ("author", pa.string()), ("text", pa.string()),
+        ("like_count", pa.int32()), ("reply_count", pa.int32()), ("score", pa.int32()),
+        ("url", pa.string()),
+    ]),
+    "scores": pa.schema([
+        ("post_id", pa.string()), ("created_at", TIMESTAMP), ("model_name", LABEL),
+        ("sentiment_label", LABEL), ("sentiment_score", pa.float32()),
+    ]),
+    "post_topics": pa.schema([
+        ("post_id", pa.string()), ("created_at", TIMESTAMP), ("topic", LABEL),
+        ("score", pa.float32()),
+    ]),
+    "aggregates": pa.schema([
+        ("bucket_date", pa.date32()), ("granularity", LABEL),
+        ("pos", pa.int64()), ("neu", pa.int64()), ("neg", pa.int64()),
+        ("total_posts", pa.int64()), ("total_interactions", pa.int64()),
+    ]),
+}
+
+# Columna de fecha de cada dataset y si además está particionado por mes
+TIME_COLUMN = {
+    "posts": ("created_at", True),
+    "scores": ("created_at", True),
+    "post_topics": ("created_at", True),
+    "aggregates": ("bucket_date", False),
+}
+
+
+def partitioning(name: str) -> ds.Partitioning:
+    fields = [("source", pa.string())]
+    if TIME_COLUMN[name][1]:
+        fields.append(("month", pa.string()))
+    return ds.partitioning(pa.schema(fields), flavor="hive")
+
+
+def path(name: str, base: str = PARQUET_DIR) -> str:
+    return os.path.join(base, name)
+
+
+def available(name: str, base: str = PARQUET_DIR) -> bool:
+    """¿Existe la exportación de ese dataset?"""
+    return os.path.isdir(path(name, base))
+
+
+def is_fresh(name: str, db_path: str, base: str = PARQUET_DIR) -> bool:
+    """¿La exportación de ese dataset es posterior a la última escritura en la DB?"""
+    if not available(name, base):
+        return False
+    exported = os.path.getmtime(path(name, base))
+    written = max(os.path.getmtime(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+    return exported >= written
+
+
+def dataset(name: str, base: str = PARQUET_DIR) -> ds.Dataset:
+    if not available(name, base):
+        raise FileNotFoundError(f"No hay exportación de '{name}' en {base} (correr export_parquet.py)")
+    return ds.dataset(path(name, base), format="parquet", partitioning=partitioning(name))
+
+
+def _day(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def date_filter(name: str, desde=None, hasta=None):
+    """Expresión para [desde, hasta] (ambos inclusivos, 'YYYY-MM-DD') o None."""
+    column, by_month = TIME_COLUMN[name]
+    expr = None
+
+    def add(e):
+        nonlocal expr
+        expr = e if expr is None else expr & e
+
+    def bound(d: date):
+        if column == "bucket_date":
+            return pa.scalar(d, pa.date32())
+        return pa.scalar(datetime(d.year, d.month, d.day, tzinfo=timezone.utc), TIMESTAMP)
+
+    if desde:
+        d = _day(desde)
+        if by_month:
+            add(ds.field("month") >= d.isoformat()[:7])   # descarta directorios enteros
+        add(ds.field(column) >= bound(d))
+    if hasta:
+        d = _day(hasta)
+        if by_month:
+            add(ds.field("month") <= d.isoformat()[:7])
+        add(ds.field(column) < bound(d + timedelta(days=1)))
+    return expr
+
+
+def load(name: str, columns=None, source=None, desde=None, hasta=None, filter=None,
+         base: str = PARQUET_DIR) -> pa.Table:
+    """
+    Lee un dataset exportado con sólo las columnas pedidas ('source' y 'month'
+    también se pueden pedir). source='all' o None no filtra por fuente (en
+    'aggregates', 'all' es la partición de totales). 'filter' es una expresión
+    extra de pyarrow.dataset, p.ej. ds.field("sentiment_label") == "neg".
+    """
+    expr = date_filter(name, desde, hasta)
+    if source and (source != "all" or name == "aggregates"):
+        e = ds.field("source") == source
+        expr = e if expr is None else expr & e
+    if filter is not None:
+        expr = filter if expr is None else expr & filter
+    return dataset(name, base).to_table(columns=columns, filter=expr)
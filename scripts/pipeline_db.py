@@ -0,0 +1,314 @@
+# pipeline_db.py
+# Utilidades compartidas por los scripts de pre-procesamiento:
+# ruta de la DB, conexión de escritura y DDL de las tablas derivadas.
+
+import os
+import random
+import re
+import sqlite3
+
+DB_PATH = os.getenv(
+    "DATABASE_URL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "databaser.db"),
+)
+
+# Modelo de sentimiento cuyas etiquetas se usan en los agregados
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+
+# Un tema se considera asignado si su score zero-shot supera este umbral.
+# Las filas migradas desde la tabla antigua no tienen score (NULL = asignado).
+UMBRAL_TEMAS = 0.30
+
+# Claves (source, entity_type) en fetch_cursors del progreso de cada etapa;
+# entity_id es el modelo. El valor es el último rowid de 'posts' procesado.
+SCORING_CURSOR = ("scoring", "model")
+TOPICS_CURSOR = ("topics", "model")
+# Primer día (YYYY-MM-DD) desde el que event_impact/sentiment_anomalies quedaron
+# atrasadas respecto de 'aggregates'; entity_id fijo "since" (aggregates.py)
+DERIVED_CURSOR = ("derived", "aggregates")
+
+# Tablas derivadas que mantiene el pipeline
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+  topic_id          INTEGER PRIMARY KEY,
+  name              TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS post_topics (
+  post_id           TEXT NOT NULL,
+  topic_id          INTEGER NOT NULL,
+  score             REAL,                        -- score zero-shot (NULL si viene de la migración)
+  PRIMARY KEY (post_id, topic_id),
+  FOREIGN KEY (post_id) REFERENCES posts(post_id),
+  FOREIGN KEY (topic_id) REFERENCES topics(topic_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_post_topics_topic ON post_topics(topic_id, post_id);
+
+CREATE TABLE IF NOT EXISTS topic_daily (
+  bucket_date       TEXT NOT NULL,               -- YYYY-MM-DD (date(posts.created_at))
+  topic             TEXT NOT NULL,
+  sentiment_label   TEXT NOT NULL,
+  total_posts       INTEGER NOT NULL,
+  PRIMARY KEY (bucket_date, topic, sentiment_label)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS aggregates (
+  bucket_date      DATE NOT NULL,     -- día o inicio de semana (lunes)
+  granularity      TEXT NOT NULL CHECK (granularity IN ('day','week')),
+  source           TEXT NOT NULL CHECK (source IN ('youtube','reddit','all')),
+  pos              INTEGER NOT NULL,
+  neu              INTEGER NOT NULL,
+  neg              INTEGER NOT NULL,
+  total_posts      INTEGER NOT NULL,
+  total_interactions INTEGER NOT NULL,
+  PRIMARY KEY (bucket_date, granularity, source)
+);
+
+-- Días (date(posts.created_at)) cuyos agregados quedaron desactualizados.
+-- Los llenan los triggers de abajo; aggregates.py los recalcula y los vacía.
+CREATE TABLE IF NOT EXISTS aggregates_dirty (
+  bucket_date       TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+-- Impacto de cada fila de 'events' por ventana de días y fuente (event_impact.py).
+-- La reconstruye aggregates.refresh_derived(); los netos son (pos - neg) / total.
+CREATE TABLE IF NOT EXISTS event_impact (
+  source            TEXT NOT NULL,
+  window_days       INTEGER NOT NULL,
+  event_id          INTEGER NOT NULL,            -- rowid en 'events'
+  event_date        TEXT NOT NULL,
+  title             TEXT,
+  tag               TEXT,
+  before_pos        INTEGER NOT NULL,            -- [fecha - N, fecha - 1]
+  before_neu        INTEGER NOT NULL,
+  before_neg        INTEGER NOT NULL,
+  before_total      INTEGER NOT NULL,
+  after_pos         INTEGER NOT NULL,            -- [fecha, fecha + N - 1]
+  after_neu         INTEGER NOT NULL,
+  after_neg         INTEGER NOT NULL,
+  after_total       INTEGER NOT NULL,
+  baseline_total    INTEGER NOT NULL,            -- días previos a la ventana 'antes'
+  baseline_days     INTEGER NOT NULL,
+  before_net        REAL,
+  after_net         REAL,
+  baseline_net      REAL,
+  delta_net         REAL,                        -- after_net - baseline_net
+  volume_lift       REAL,                        -- comentarios/día después vs. línea base
+  top_topics        TEXT,                        -- JSON [{topic, total, neg_share}]
+  PRIMARY KEY (source, window_days, event_id)
+) WITHOUT ROWID;
+
+-- Días con proporción negativa o volumen anómalos por fuente (anomalies.py):
+-- z-score contra los días previos. La actualiza aggregates.refresh_derived().
+CREATE TABLE IF NOT EXISTS sentiment_anomalies (
+  source            TEXT NOT NULL,
+  metric            TEXT NOT NULL CHECK (metric IN ('neg_share','volume')),
+  bucket_date       TEXT NOT NULL,               -- YYYY-MM-DD
+  value             REAL NOT NULL,               -- valor del día
+  baseline_mean     REAL NOT NULL,               -- media y desvío de la ventana previa
+  baseline_std      REAL NOT NULL,
+  zscore            REAL NOT NULL,
+  direction         TEXT NOT NULL CHECK (direction IN ('spike','drop')),
+  total_posts       INTEGER NOT NULL,
+  PRIMARY KEY (source, metric, bucket_date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS inference_cache (
+  model_name        TEXT NOT NULL,               -- modelo (+ backend / conjunto de etiquetas)
+  text_hash         BLOB NOT NULL,               -- xxh3_128 del texto normalizado
+  result_json       TEXT NOT NULL,               -- salida del modelo ({label, score} o {labels, scores})
+  created_at        TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (model_name, text_hash)
+) WITHOUT ROWID;
+"""
+
+
+# Triggers que marcan días sucios: scores del modelo de referencia, cambios de
+# engagement/fecha en posts y asignaciones de temas. (ON CONFLICT DO NOTHING y no
+# INSERT OR IGNORE: dentro de un trigger el OR de la sentencia externa pisa al
+# propio, y un upsert sobre posts lo convertiría en ABORT.) Un created_at que
+# date() no entiende da NULL: esos posts no marcan días (refresh tampoco los
+# cuenta) en vez de abortar la escritura por el NOT NULL de bucket_date.
+DIRTY_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS trg_dirty_scores_ins AFTER INSERT ON scores
+WHEN NEW.model_name = '{SENTIMENT_MODEL}'
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(created_at) FROM posts
+    WHERE post_id = NEW.post_id AND date(created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_scores_upd AFTER UPDATE ON scores
+WHEN NEW.model_name = '{SENTIMENT_MODEL}' OR OLD.model_name = '{SENTIMENT_MODEL}'
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(created_at) FROM posts
+    WHERE post_id IN (OLD.post_id, NEW.post_id) AND date(created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_scores_del AFTER DELETE ON scores
+WHEN OLD.model_name = '{SENTIMENT_MODEL}'
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(created_at) FROM posts
+    WHERE post_id = OLD.post_id AND date(created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_posts_upd AFTER UPDATE OF created_at, like_count, reply_count, score ON posts
+WHEN OLD.created_at IS NOT NEW.created_at OR OLD.like_count IS NOT NEW.like_count
+  OR OLD.reply_count IS NOT NEW.reply_count OR OLD.score IS NOT NEW.score
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(OLD.created_at) WHERE date(OLD.created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+  INSERT INTO aggregates_dirty SELECT date(NEW.created_at) WHERE date(NEW.created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_posts_del AFTER DELETE ON posts
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(OLD.created_at) WHERE date(OLD.created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_topics_ins AFTER INSERT ON post_topics
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(created_at) FROM posts
+    WHERE post_id = NEW.post_id AND date(created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_topics_upd AFTER UPDATE ON post_topics
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(created_at) FROM posts
+    WHERE post_id IN (OLD.post_id, NEW.post_id) AND date(created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_topics_del AFTER DELETE ON post_topics
+BEGIN
+  INSERT INTO aggregates_dirty SELECT date(created_at) FROM posts
+    WHERE post_id = OLD.post_id AND date(created_at) IS NOT NULL
+    ON CONFLICT DO NOTHING;
+END;
+"""
+# Nombres, para recrearlos en ensure_schema()
+_TRIGGER_NAMES = re.findall(r"CREATE TRIGGER IF NOT EXISTS (\w+)", DIRTY_TRIGGERS)
+
+# Índice de texto completo sobre posts.text (contenido externo: no duplica el
+# texto, sólo guarda el índice invertido por rowid). Los triggers lo mantienen
+# al día; se crea y llena con migrar_fts.py.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+  text, content = 'posts', content_rowid = 'rowid',
+  tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_posts_fts_ins AFTER INSERT ON posts
+BEGIN
+  INSERT INTO posts_fts (rowid, text) VALUES (NEW.rowid, NEW.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_posts_fts_del AFTER DELETE ON posts
+BEGIN
+  INSERT INTO posts_fts (posts_fts, rowid, text) VALUES ('delete', OLD.rowid, OLD.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_posts_fts_upd AFTER UPDATE OF text ON posts
+BEGIN
+  INSERT INTO posts_fts (posts_fts, rowid, text) VALUES ('delete', OLD.rowid, OLD.text);
+  INSERT INTO posts_fts (rowid, text) VALUES (NEW.rowid, NEW.text);
+END;
+"""
+
+# Índices para las consultas de la API (backend/app.py, backend/comments.py);
+# los crea migrar_indices.py y backend/check_query_plans.py verifica que se usen.
+API_INDEXES = """
+-- engagement por sentimiento y /comments?sort=recent por fuente: rango sobre
+-- created_at sin tocar la tabla (cubre likes, replies y post_id para el JOIN)
+CREATE INDEX IF NOT EXISTS idx_posts_source_created
+  ON posts (source, created_at, like_count, reply_count, post_id);
+
+-- /top_comments y /comments?sort=likes: recorrido ya ordenado por likes
+-- (misma expresión que el ORDER BY, NULL cuenta como 0), con y sin fuente
+CREATE INDEX IF NOT EXISTS idx_posts_likes
+  ON posts (COALESCE(like_count, 0), post_id);
+CREATE INDEX IF NOT EXISTS idx_posts_source_likes
+  ON posts (source, COALESCE(like_count, 0), post_id);
+
+-- JOIN con scores por (post_id, model_name) que ya trae la etiqueta
+CREATE INDEX IF NOT EXISTS idx_scores_post_model_label
+  ON scores (post_id, model_name, sentiment_label);
+"""
+
+
+def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Abre la DB para escritura con los mismos pragmas que usa el scoring."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return conn
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Crea (si faltan) las tablas derivadas del pipeline y los triggers de días sucios."""
+    conn.executescript(SCHEMA)
+    # Se recrean siempre (en una transacción) para que una DB ya migrada tome
+    # la versión actual de los triggers
+    drops = "".join(f"DROP TRIGGER IF EXISTS {name};\n" for name in _TRIGGER_NAMES)
+    conn.executescript(f"BEGIN;\n{drops}{DIRTY_TRIGGERS}\nCOMMIT;")
+
+
+def topic_ids(conn: sqlite3.Connection, names) -> dict:
+    """Devuelve {nombre: topic_id}, dando de alta en 'topics' los que falten."""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    conn.executemany("INSERT OR IGNORE INTO topics (name) VALUES (?)", ((n,) for n in names))
+    placeholders = ",".join("?" * len(names))
+    rows = conn.execute(f"SELECT name, topic_id FROM topics WHERE name IN ({placeholders})", names)
+    return dict(rows.fetchall())
+
+
+def load_cursor(conn: sqlite3.Connection, source: str, entity_type: str, entity_id: str):
+    """Último cursor guardado en 'fetch_cursors' para esa entidad (o None)."""
+    row = conn.execute("""
+      SELECT last_cursor FROM fetch_cursors
+      WHERE source = ? AND entity_type = ? AND entity_id = ?
+    """, (source, entity_type, entity_id)).fetchone()
+    return row[0] if row else None
+
+
+def save_cursor(conn: sqlite3.Connection, source: str, entity_type: str, entity_id: str, value) -> None:
+    """Guarda/actualiza el cursor de una entidad. El commit lo hace quien llama."""
+    conn.execute("""
+      INSERT INTO fetch_cursors (source, entity_type, entity_id, last_cursor, last_datetime)
+      VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+      ON CONFLICT (source, entity_type, entity_id)
+      DO UPDATE SET last_cursor = excluded.last_cursor, last_datetime = excluded.last_datetime
+    """, (source, entity_type, entity_id, str(value)))
+
+
+def clear_cursor(conn: sqlite3.Connection, source: str, entity_type: str, entity_id: str) -> None:
+    """Borra el cursor de una entidad. El commit lo hace quien llama."""
+    conn.execute("""
+      DELETE FROM fetch_cursors WHERE source = ? AND entity_type = ? AND entity_id = ?
+    """, (source, entity_type, entity_id))
+
+
+def sample_post_texts(conn: sqlite3.Connection, n: int, seed: int = 42) -> list:
+    """Muestra aleatoria reproducible de textos no vacíos de 'posts' (por rowid, sin ORDER BY random())."""
+    rowids = [r[0] for r in conn.execute(
+        "SELECT rowid FROM posts WHERE text IS NOT NULL AND length(text) > 0"
+    )]
+    picked = random.Random(seed).sample(rowids, min(n, len(rowids)))
+    texts = []
+    for start in range(0, len(picked), 500):
+        chunk = picked[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        texts += [r[0] for r in conn.execute(f"SELECT text FROM posts WHERE rowid IN ({marks})", chunk)]
+    return texts
+
+
+def table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    q = "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?"
+    return conn.execute(q, (name,)).fetchone() is not None
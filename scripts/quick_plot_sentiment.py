@@ -6,11 +6,16 @@
 #   set SOURCE=all          # youtube | reddit | all
 #   set FROM_DATE=2020-01-01
 #   set TO_DATE=2022-12-31
+# Si la exportación Parquet (export_parquet.py) está al día con la DB, lee de
+# ahí: sólo las columnas y particiones del rango, sin pasar por SQLite.
 
 import os
 import sqlite3
 import pandas as pd
+import pyarrow.dataset as ds
 import matplotlib.pyplot as plt
+
+from parquet_store import is_fresh, load
 DB_PATH = os.getenv("DATABASE_URL", "./data/databaser.db")
 SOURCE    = os.environ.get("SOURCE", "all")           # 'youtube' | 'reddit' | 'all'
 FROM_DATE = os.environ.get("FROM_DATE", "2020-01-01")
@@ -26,15 +31,26 @@ def load_from_aggregates(conn):
         FROM aggregates
         WHERE granularity='day'
           AND date(bucket_date) BETWEEN date(?) AND date(?)
+          AND source=?
     """
-    args = (FROM_DATE, TO_DATE)
-    if SOURCE != "all":
-        base += " AND source=?"
-        args += (SOURCE,)
+    # 'all' es una fila propia de aggregates (suma de las fuentes)
+    args = (FROM_DATE, TO_DATE, SOURCE)
     base += " ORDER BY bucket_date ASC"
     df = pd.read_sql_query(base, conn, params=args, parse_dates=["date"])
     return df
 
+def load_from_parquet():
+    # Mismas columnas que load_from_aggregates, desde la exportación Parquet
+    table = load(
+        "aggregates",
+        columns=["bucket_date", "pos", "neu", "neg", "total_posts", "total_interactions", "source"],
+        source=SOURCE, desde=FROM_DATE, hasta=TO_DATE,
+        filter=ds.field("granularity") == "day",
+    )
+    df = table.to_pandas().rename(columns={"bucket_date": "date"})
+    df["date"] = pd.to_datetime(df["date"])
+    return df.sort_values("date")
+
 def compute_on_the_fly(conn):
     # Agregado diario desde posts + scores (por si no existe 'aggregates')
     where_src = "" if SOURCE == "all" else "AND p.source = ?"
@@ -62,11 +78,14 @@ def main():
     if not os.path.exists(DB_PATH):
         raise SystemExit(f"No se encontró la base: {DB_PATH}")
 
-    with sqlite3.connect(DB_PATH) as conn:
-        if table_exists(conn, "aggregates"):
-            df = load_from_aggregates(conn)
-        else:
-            df = compute_on_the_fly(conn)
+    if is_fresh("aggregates", DB_PATH):
+        df = load_from_parquet()
+    else:
+        with sqlite3.connect(DB_PATH) as conn:
+            if table_exists(conn, "aggregates"):
+                df = load_from_aggregates(conn)
+            else:
+                df = compute_on_the_fly(conn)
 
     if df.empty:
         raise SystemExit("No hay datos para el rango/criterio elegido. Revisa SOURCE/fechas.")
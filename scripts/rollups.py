@@ -0,0 +1,44 @@
+# rollups.py
+# Pre-agregado tema × sentimiento × día ('topic_daily') para el endpoint /topics.
+# Se construye junto a 'aggregates': el backend sólo suma filas ya agrupadas por
+# día en lugar de recorrer los temas de cada comentario en cada request.
+#
+# Uso:
+#   python rollups.py
+
+import sys
+
+from pipeline_db import DB_PATH, SENTIMENT_MODEL, UMBRAL_TEMAS, connect, ensure_schema
+
+
+def build_topic_rollup(conn) -> int:
+    """
+    Reconstruye 'topic_daily' desde 'post_topics'.
+    Devuelve el número de filas (día, tema, sentimiento) escritas.
+    """
+    ensure_schema(conn)
+    with conn:
+        conn.execute("DELETE FROM topic_daily")
+        cur = conn.execute("""
+            INSERT INTO topic_daily (bucket_date, topic, sentiment_label, total_posts)
+            SELECT date(p.created_at), t.name, s.sentiment_label, COUNT(*)
+            FROM post_topics AS pt
+            INNER JOIN topics AS t ON t.topic_id = pt.topic_id
+            INNER JOIN posts  AS p ON p.post_id = pt.post_id
+            INNER JOIN scores AS s ON s.post_id = pt.post_id AND s.model_name = ?
+            WHERE COALESCE(pt.score, 1.0) > ?
+            GROUP BY 1, 2, 3
+        """, (SENTIMENT_MODEL, UMBRAL_TEMAS))
+    return cur.rowcount
+
+
+if __name__ == "__main__":
+    conn = connect(DB_PATH)
+    try:
+        n = build_topic_rollup(conn)
+    except Exception as e:
+        print(f"Error al construir topic_daily: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"✓ topic_daily actualizada: {n} filas (día, tema, sentimiento)")
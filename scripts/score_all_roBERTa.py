@@ -1,42 +1,67 @@
-import os, re, sqlite3, sys, time
+import os, queue, sqlite3, sys, time
+import multiprocessing as mp
 from contextlib import closing
 from tqdm import tqdm
 
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, TextClassificationPipeline
 
-DB_PATH = os.getenv("DATABASE_URL", "./data/databaser.db")
-# DB_PATH = r"C:\Users\matia\Desktop\analysis.db\databaser.db"  # <-- AJUSTA RUTA SI ES NECESARIO
+from aggregates import refresh as refresh_aggregates
+from batching import classify_bucketed
+from inference_backends import BACKENDS, build_classifier as build_backend, scores_model_name
+from inference_cache import lookup, normalize, split_cached, store, text_hash
+from pipeline_db import DB_PATH, SCORING_CURSOR, ensure_schema, load_cursor, save_cursor
+
+# DB_PATH viene de pipeline_db (DATABASE_URL o data/databaser.db relativo al repo,
+# no al directorio actual): la misma DB que tematicas.py y aggregates.py
 MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
-PIPE_MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"  # lo guardaremos así en 'scores.model_name'
 
-# ---------- helpers ----------
-def clean_text(s: str) -> str:
-    if s is None:
-        return ""
-    s = re.sub(r"http\S+", " ", s)            # URLs fuera
-    s = re.sub(r"@\w+", "@user", s)           # menciones
-    s = re.sub(r"#(\w+)", r"\1", s)           # hashtags -> palabra
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+# Backend de inferencia (ver inference_backends.py): torch | int8 | onnx | onnx-int8.
+# Los backends distintos de 'torch' guardan sus scores como 'modelo+backend';
+# SCORES_MODEL_NAME fuerza el nombre (p.ej. el del modelo, para reemplazar los fp32
+# una vez revisada la concordancia con check_backend_agreement.py).
+SCORING_BACKEND = os.getenv("SCORING_BACKEND", "torch")
+if SCORING_BACKEND not in BACKENDS:
+    sys.exit(f"SCORING_BACKEND inválido: {SCORING_BACKEND!r} (opciones: {', '.join(BACKENDS)})")
+PIPE_MODEL_NAME = os.getenv("SCORES_MODEL_NAME") or scores_model_name(MODEL_NAME, SCORING_BACKEND)  # así en 'scores.model_name'
+
+# Caché de inferencias por texto (ver inference_cache.py): los textos repetidos se
+# clasifican una sola vez. La clave es el modelo+backend real, no SCORES_MODEL_NAME.
+# INFERENCE_CACHE=0 la desactiva (se sigue deduplicando dentro de cada tanda).
+CACHE_MODEL = scores_model_name(MODEL_NAME, SCORING_BACKEND)
+USE_CACHE = os.getenv("INFERENCE_CACHE", "1") == "1"
+
+# Modo incremental: la marca de agua (último rowid de 'posts' ya revisado para
+# este modelo) se guarda en fetch_cursors, así cada corrida sólo lee los posts
+# nuevos con un range scan por rowid en lugar del anti-join sobre toda la tabla.
+# FULL_RESCAN=1 ignora la marca y revisa todo 'posts' (sin re-clasificar lo ya puntuado).
+# La marca supone que los rowid sólo crecen. 'posts' no tiene INTEGER PRIMARY KEY:
+# un VACUUM puede renumerarlos y borrar los posts más nuevos libera sus rowid para
+# reusarlos. Tras un VACUUM, migrar_fts.py --rebuild borra esta marca y la de
+# tematicas.py; tras borrar posts conviene una corrida con FULL_RESCAN=1.
+CURSOR_KEY = SCORING_CURSOR   # (source, entity_type) en fetch_cursors
+FULL_RESCAN = os.getenv("FULL_RESCAN", "0") == "1"
+
+# Lotes por presupuesto de tokens (ver batching.py) en vez de 32 textos fijos
+MAX_LENGTH = 256                                               # 256 tokens suele ser suficiente para comentarios
+MAX_TOKENS_PER_BATCH = int(os.getenv("MAX_TOKENS_PER_BATCH", "8192"))  # ajusta según RAM/GPU
+
+# Modo multi-proceso (CPU): un lector (este proceso) reparte tandas a N workers
+# de inferencia, cada uno con su modelo y torch.set_num_threads fijo, y un único
+# proceso escritor hace los INSERT en 'scores' en transacciones grandes.
+# SCORING_WORKERS=1 (por defecto) usa el bucle simple en un solo proceso.
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "1"))
+THREADS_PER_WORKER = int(os.getenv("THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // SCORING_WORKERS)
+WRITE_COMMIT_ROWS = int(os.getenv("WRITE_COMMIT_ROWS", "20000"))  # filas por transacción del escritor
 
+# ---------- helpers ----------
 def get_device():
     if torch.cuda.is_available():
         return 0
     return -1  # CPU
 
 # ---------- load model ----------
-device = get_device()
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
-clf = TextClassificationPipeline(
-    model=model,
-    tokenizer=tokenizer,
-    device=device,               # 0 = GPU, -1 = CPU
-    truncation=True,
-    max_length=256,              # 256 tokens suele ser suficiente para comentarios
-    batch_size=32                # ajusta a 16/64 según RAM/GPU
-)
+def build_classifier(threads: int = 0):
+    return build_backend(MODEL_NAME, SCORING_BACKEND, MAX_LENGTH, get_device(), threads)
 
 # El modelo devuelve labels tipo: "negative", "neutral", "positive"
 def norm_label(lbl: str) -> str:
@@ -45,77 +70,246 @@ def norm_label(lbl: str) -> str:
     if l.startswith("neg"): return "neg"
     return "neu"
 
-# ---------- main loop ----------
+# ---------- marca de agua ----------
+def load_watermark(cur) -> int:
+    if FULL_RESCAN:
+        return 0
+    value = load_cursor(cur.connection, *CURSOR_KEY, PIPE_MODEL_NAME)
+    return int(value) if value else 0
+
+def save_watermark(conn, last_rowid: int):
+    """
+    Guarda la marca sólo si es un rowid real: un None quedaría guardado como
+    'None' y la próxima corrida fallaría en 'rowid > ?'.
+    """
+    if isinstance(last_rowid, int) and not isinstance(last_rowid, bool):
+        save_cursor(conn, *CURSOR_KEY, PIPE_MODEL_NAME, last_rowid)
+
+# Posts con texto, posteriores a la marca y sin score de este modelo.
+# El NOT EXISTS es una búsqueda por la PK (post_id, model_name) de 'scores'.
+PENDING_WHERE = """
+  p.rowid > ? AND p.text IS NOT NULL AND length(p.text) > 0
+  AND NOT EXISTS (
+    SELECT 1 FROM scores s WHERE s.post_id = p.post_id AND s.model_name = ?
+  )
+"""
+
+# ---------- lectura / inferencia / escritura ----------
 BATCH_SELECT = 2000   # cuántos recuperar de la BD por tanda
-COMMIT_EVERY = 500    # cada cuántos inserts hacer commit
 
-with closing(sqlite3.connect(DB_PATH)) as conn:
+def connect_db():
+    conn = sqlite3.connect(DB_PATH)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
-    cur = conn.cursor()
-
-    # Cuenta cuántos posts NO tienen score con este modelo
-    cur.execute("""
-      SELECT COUNT(*)
-      FROM posts p
-      LEFT JOIN scores s ON s.post_id = p.post_id AND s.model_name = ?
-      WHERE s.post_id IS NULL AND p.text IS NOT NULL AND length(p.text) > 0
-    """, (PIPE_MODEL_NAME,))
-    total_pending = cur.fetchone()[0]
-    if total_pending == 0:
-        print("No hay posts pendientes para este modelo. ¡Listo!")
-        sys.exit(0)
-
-    print(f"Pendientes por clasificar: {total_pending:,}")
-
-    # Procesa por tandas para no cargar todo en memoria
-    processed = 0
-    inserted_since_commit = 0
+    return conn
 
-    pbar = tqdm(total=total_pending, unit="post")
+def iter_pending_batches(cur, watermark: int, max_rowid: int):
+    """Tandas de (rowid, post_id, text) pendientes, por rango de rowid creciente."""
+    last = watermark
     while True:
-        # Selecciona una tanda de posts aún no clasificados por este modelo
-        cur.execute("""
-          SELECT p.post_id, p.text
+        # Lectura por clave desde el último rowid visto, sin re-ordenar pendientes
+        cur.execute(f"""
+          SELECT p.rowid, p.post_id, p.text
           FROM posts p
-          LEFT JOIN scores s ON s.post_id = p.post_id AND s.model_name = ?
-          WHERE s.post_id IS NULL AND p.text IS NOT NULL AND length(p.text) > 0
-          ORDER BY p.created_at ASC
+          WHERE {PENDING_WHERE} AND p.rowid <= ?
+          ORDER BY p.rowid
           LIMIT ?
-        """, (PIPE_MODEL_NAME, BATCH_SELECT))
+        """, (last, PIPE_MODEL_NAME, max_rowid, BATCH_SELECT))
         rows = cur.fetchall()
         if not rows:
-            break
+            return
+        last = rows[-1][0]
+        yield rows
 
-        post_ids = [r[0] for r in rows]
-        texts = [clean_text(r[1])[:1200] for r in rows]  # recorte duro por seguridad
-
-        # Clasificar en lote
-        results = clf(texts)
-
-        # Preparar inserciones
-        to_insert = []
-        for pid, r in zip(post_ids, results):
-            label = norm_label(r["label"])
-            score = float(r["score"])
-            to_insert.append((pid, PIPE_MODEL_NAME, label, score))
-
-        # Upsert en scores
-        cur.executemany("""
-          INSERT OR REPLACE INTO scores (post_id, model_name, sentiment_label, sentiment_score)
-          VALUES (?,?,?,?)
-        """, to_insert)
-        inserted_since_commit += len(to_insert)
-        processed += len(to_insert)
-        pbar.update(len(to_insert))
+INSERT_SCORES = """
+  INSERT OR REPLACE INTO scores (post_id, model_name, sentiment_label, sentiment_score)
+  VALUES (?,?,?,?)
+"""
 
-        # Commit periódico
-        if inserted_since_commit >= COMMIT_EVERY:
-            conn.commit()
-            inserted_since_commit = 0
+def prepare_batch(conn, rows):
+    """Normaliza los textos de una tanda y trae de la caché los ya clasificados."""
+    post_ids = [r[1] for r in rows]
+    texts = [normalize(r[2]) for r in rows]   # misma limpieza que tematicas.py
+    hashes = [text_hash(t) for t in texts]
+    known = lookup(conn, CACHE_MODEL, hashes) if USE_CACHE else {}
+    return post_ids, texts, hashes, known
+
+def score_rows(clf, batch):
+    """
+    Clasifica sólo los textos únicos que no estaban en caché y devuelve
+    (filas para 'scores', entradas nuevas para 'inference_cache').
+    """
+    post_ids, texts, hashes, known = batch
+    todo = split_cached(hashes, known)
+
+    # Clasificar en lotes de largo similar (resultados en el orden de 'todo')
+    results = classify_bucketed(clf, [texts[i] for i in todo], MAX_LENGTH, MAX_TOKENS_PER_BATCH)
+    new = [(hashes[i], {"label": r["label"], "score": float(r["score"])}) for i, r in zip(todo, results)]
+    known = {**known, **dict(new)}
+
+    to_insert = []
+    for pid, h in zip(post_ids, hashes):
+        r = known[h]
+        to_insert.append((pid, PIPE_MODEL_NAME, norm_label(r["label"]), float(r["score"])))
+    return to_insert, new
+
+def write_batch(conn, to_insert, new_cache):
+    conn.executemany(INSERT_SCORES, to_insert)
+    if USE_CACHE:
+        store(conn, CACHE_MODEL, new_cache)
+
+def run_serial(cur, watermark: int, max_rowid: int, total_pending: int):
+    """Un proceso: leer, clasificar y escribir tanda por tanda."""
+    conn = cur.connection
+    clf = build_classifier()
+
+    pbar = tqdm(total=total_pending, unit="post")
+    for rows in iter_pending_batches(cur, watermark, max_rowid):
+        to_insert, new_cache = score_rows(clf, prepare_batch(conn, rows))
+
+        # Upsert en scores y caché + avance de la marca en la misma transacción
+        write_batch(conn, to_insert, new_cache)
+        save_watermark(conn, rows[-1][0])
+        conn.commit()
+        refresh_aggregates(conn, derived=False)   # los dashboards ven la tanda en segundos
+        pbar.update(len(to_insert))
 
-    # Commit final
+    # Todo lo que había hasta max_rowid quedó revisado
+    save_watermark(conn, max_rowid)
     conn.commit()
+    refresh_aggregates(conn)
     pbar.close()
 
-print("✅ Clasificación completa.")
+def inference_worker(tasks, results, threads: int):
+    """Proceso de inferencia: modelo propio con un número fijo de hilos de torch."""
+    torch.set_num_threads(threads)
+    clf = build_classifier(threads)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, last_rowid, batch = task
+        results.put((seq, last_rowid, *score_rows(clf, batch)))
+    results.put(None)
+
+def writer_process(results, n_workers: int, max_rowid: int, total_pending: int):
+    """
+    Único escritor: acumula resultados y hace commit cada WRITE_COMMIT_ROWS filas.
+    Las tandas pueden llegar desordenadas; la marca de agua sólo avanza hasta la
+    última tanda contigua ya escrita, así una caída nunca salta posts sin score.
+    """
+    with closing(connect_db()) as conn:
+        done = {}              # seq -> último rowid de esa tanda
+        next_seq = 0
+        watermark = None
+        uncommitted = 0
+        finished = 0
+
+        pbar = tqdm(total=total_pending, unit="post")
+        while finished < n_workers:
+            item = results.get()
+            if item is None:
+                finished += 1
+                continue
+            seq, last_rowid, to_insert, new_cache = item
+            write_batch(conn, to_insert, new_cache)
+            uncommitted += len(to_insert)
+            pbar.update(len(to_insert))
+
+            done[seq] = last_rowid
+            while next_seq in done:
+                watermark = done.pop(next_seq)
+                next_seq += 1
+
+            if uncommitted >= WRITE_COMMIT_ROWS:
+                save_watermark(conn, watermark)
+                conn.commit()
+                refresh_aggregates(conn, derived=False)
+                uncommitted = 0
+
+        # Con tandas sin escribir (un worker cayó) la marca se queda en la última
+        # tanda contigua; si ni la primera llegó, watermark es None y no se toca
+        save_watermark(conn, max_rowid if not done else watermark)
+        conn.commit()
+        refresh_aggregates(conn)
+        pbar.close()
+
+def run_parallel(cur, watermark: int, max_rowid: int, total_pending: int):
+    """Lector (este proceso) -> N workers de inferencia -> 1 escritor."""
+    ctx = mp.get_context("spawn")      # torch no es seguro con fork
+    tasks = ctx.Queue(maxsize=2 * SCORING_WORKERS)   # contrapresión: no leer de más
+    results = ctx.Queue(maxsize=4 * SCORING_WORKERS)
+
+    print(f"Modo multi-proceso: {SCORING_WORKERS} workers × {THREADS_PER_WORKER} hilos")
+    workers = [
+        ctx.Process(target=inference_worker, args=(tasks, results, THREADS_PER_WORKER))
+        for _ in range(SCORING_WORKERS)
+    ]
+    writer = ctx.Process(target=writer_process,
+                         args=(results, SCORING_WORKERS, max_rowid, total_pending))
+    procs = workers + [writer]
+    for p in procs:
+        p.start()
+
+    try:
+        for seq, rows in enumerate(iter_pending_batches(cur, watermark, max_rowid)):
+            put_while_alive(tasks, (seq, rows[-1][0], prepare_batch(cur.connection, rows)), procs)
+        for _ in workers:
+            put_while_alive(tasks, None, procs)
+
+        # Esperar al escritor; si un worker muere, el escritor nunca recibiría su fin
+        while writer.is_alive() and not failed(procs):
+            writer.join(timeout=1)
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+
+    for p in procs:
+        p.join()
+    if failed(procs):
+        raise SystemExit("Un proceso de scoring terminó con error; la marca de agua quedó en la última tanda escrita.")
+
+def put_while_alive(q, item, procs):
+    """put() en la cola sin bloquearse para siempre si algún proceso murió."""
+    while True:
+        try:
+            q.put(item, timeout=1)
+            return
+        except queue.Full:
+            if failed(procs):
+                raise SystemExit("Un proceso de scoring terminó con error; se detiene el lector.")
+
+def failed(procs) -> bool:
+    return any(p.exitcode not in (None, 0) for p in procs)
+
+# ---------- main ----------
+def main():
+    with closing(connect_db()) as conn:
+        ensure_schema(conn)
+        cur = conn.cursor()
+
+        watermark = load_watermark(cur)
+        max_rowid = cur.execute("SELECT COALESCE(MAX(rowid), 0) FROM posts").fetchone()[0]
+
+        # Cuenta cuántos posts nuevos NO tienen score con este modelo
+        cur.execute(f"SELECT COUNT(*) FROM posts p WHERE {PENDING_WHERE} AND p.rowid <= ?",
+                    (watermark, PIPE_MODEL_NAME, max_rowid))
+        total_pending = cur.fetchone()[0]
+        if total_pending == 0:
+            save_watermark(conn, max_rowid)
+            conn.commit()
+            print("No hay posts pendientes para este modelo. ¡Listo!")
+            return
+
+        print(f"Pendientes por clasificar: {total_pending:,} (desde rowid {watermark:,})")
+        print(f"Backend: {SCORING_BACKEND} -> scores.model_name = {PIPE_MODEL_NAME}")
+        if SCORING_WORKERS > 1:
+            run_parallel(cur, watermark, max_rowid, total_pending)
+        else:
+            run_serial(cur, watermark, max_rowid, total_pending)
+
+    print("✅ Clasificación completa.")
+
+if __name__ == "__main__":
+    main()
@@ -1,155 +1,185 @@
-# script: procesar_tematicas.py (Versión Mejorada con Progreso)
+# script: procesar_tematicas.py (Versión en streaming, reanudable)
+#
+# Clasifica temáticas (Zero-Shot o embeddings) de los posts con sentimiento y guarda un score
+# por (post, tema) en 'post_topics'. Lee 'posts' por tramos ordenados por rowid
+# (keyset, sin OFFSET) y cada tramo se escribe en su propia transacción junto
+# con el progreso en 'fetch_cursors': si el proceso se cae, la siguiente corrida
+# sigue desde el último post confirmado. La memoria no crece con el corpus.
+#
+# Uso:
+#   python tematicas.py              # continúa donde quedó
+#   python tematicas.py --reiniciar  # vuelve a recorrer todos los posts
+#   TOPIC_ENGINE=embeddings python tematicas.py   # motor rápido (ver topic_engines.py)
 
-import pandas as pd
-import sqlite3
-from transformers import pipeline
 import os
-from tqdm import tqdm
+import sys
 import time
+from tqdm import tqdm
 
-# --- CONFIGURACIÓN ---
-DB_PATH = '../data/databaser.db'
-print(f"Buscando DB en: {os.path.abspath(DB_PATH)}")
-TABLA_POSTS = 'posts'
-TABLA_SCORES = 'scores'
-COL_TEXTO = 'text'
-COL_SENTIMIENTO = 'sentiment_label'
-COL_JOIN = 'post_id'
-NUEVA_TABLA = "datos_finales_con_temas"
-
-# ---------------------
-
-# 1. Cargar el modelo
-print("Cargando modelo Zero-Shot...")
-classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",
-    device=0  # Forzar GPU (cuda:0)
+from inference_cache import classify_cached, normalize
+from pipeline_db import (
+    DB_PATH, SCORING_CURSOR, SENTIMENT_MODEL, TOPICS_CURSOR, UMBRAL_TEMAS,
+    connect, ensure_schema, load_cursor, save_cursor, topic_ids,
 )
-print("Modelo cargado.")
+from aggregates import refresh as refresh_aggregates
+from topic_engines import build_engine
 
-# 2. Define las temáticas
+# --- CONFIGURACIÓN ---
+TOPIC_ENGINE = os.getenv("TOPIC_ENGINE", "zero-shot")   # zero-shot | embeddings
+TRAMO = 512        # posts leídos y confirmados por transacción
+
+# Define las temáticas
 tematicas_candidatas = [
     "Música", "Polémicas", "Familia", "Religión",
     "Entrevista con Joe Rogan", "Moda / Yeezy", "Política"
 ]
 
-# 3. Conéctate a la DB y carga los datos
-print(f"Conectando a {DB_PATH} y uniendo {TABLA_POSTS} y {TABLA_SCORES}...")
-try:
-    conn = sqlite3.connect(DB_PATH)
-    query = f"""
-        SELECT
-            t1.{COL_JOIN},
-            t1.{COL_TEXTO},
-            t2.{COL_SENTIMIENTO}
-        FROM {TABLA_POSTS} AS t1
-        INNER JOIN {TABLA_SCORES} AS t2 ON t1.{COL_JOIN} = t2.{COL_JOIN}
+# Caché de inferencias y progreso: la salida depende del motor/modelo y de las
+# etiquetas candidatas, así que cambiar cualquiera empieza un recorrido nuevo
+motor = build_engine(TOPIC_ENGINE, tematicas_candidatas)
+CLAVE_CACHE = motor.cache_key
+
+# Posts con sentimiento del modelo de referencia, en orden de rowid
+QUERY_TRAMO = """
+    SELECT p.rowid, p.post_id, p.text, s.sentiment_label
+    FROM posts AS p
+    INNER JOIN scores AS s ON s.post_id = p.post_id AND s.model_name = ?
+    WHERE p.rowid > ? AND p.rowid <= ?
+    ORDER BY p.rowid
+    LIMIT ?
+"""
+# ---------------------
+
+
+def limite_superior(conn) -> int:
+    """
+    Hasta qué rowid avanzar: el último post ya revisado por el scoring de
+    sentimiento (así no se salta un post que todavía no tiene score).
+    Si no hay marca del scoring (DB puntuada antes de la marca, o marca
+    guardada con otro modelo) se frena justo antes del primer post con texto
+    sin score de SENTIMENT_MODEL, o en el máximo rowid si están todos.
     """
-    df = pd.read_sql_query(query, conn)
-    print(f"✓ Datos cargados: {len(df)} comentarios en memoria.")
-except Exception as e:
-    print(f"Error al leer la base de datos: {e}")
-    exit()
-
-# --- PROCESAMIENTO CON PROGRESO ---
-print(f"\nIniciando clasificación de {len(df)} comentarios...")
-print("=" * 60)
-
-# Limpiar textos
-df[COL_TEXTO] = df[COL_TEXTO].fillna('').astype(str)
-textos_lista = df[COL_TEXTO].tolist()
-
-# Procesar en chunks con barra de progreso
-BATCH_SIZE = 64
-resultados_batch = []
-tiempo_inicio = time.time()
-
-# Dividir en chunks para mostrar progreso
-num_chunks = (len(textos_lista) + BATCH_SIZE - 1) // BATCH_SIZE
-
-print(f"Procesando en {num_chunks} batches de hasta {BATCH_SIZE} textos...")
-
-for i in tqdm(range(0, len(textos_lista), BATCH_SIZE), 
-              desc="Clasificando", 
-              unit="batch",
-              ncols=100):
-    chunk = textos_lista[i:i+BATCH_SIZE]
-    batch_resultado = classifier(
-        chunk,
-        tematicas_candidatas,
-        multi_label=True
-    )
-    resultados_batch.extend(batch_resultado)
-    
-    # Mostrar ejemplo cada 500 batches
-    if (i // BATCH_SIZE) % 500 == 0 and i > 0:
-        ejemplo_idx = i
-        print(f"\n  📝 Ejemplo [{ejemplo_idx}]: '{textos_lista[ejemplo_idx][:60]}...'")
-        ejemplo = resultados_batch[ejemplo_idx]
-        print(f"     Scores: {dict(zip(ejemplo['labels'][:3], [f'{s:.3f}' for s in ejemplo['scores'][:3]]))}")
-
-tiempo_clasificacion = time.time() - tiempo_inicio
-print(f"\n✓ Procesamiento completado en {tiempo_clasificacion/60:.2f} minutos")
-print(f"  Velocidad: {len(textos_lista)/tiempo_clasificacion:.1f} textos/segundo")
-
-# 5. Filtrar los resultados
-print("\nFiltrando por umbral (0.30)...")
-umbral = 0.30
-tematicas_finales = []
-temas_contador = {tema: 0 for tema in tematicas_candidatas}
-
-for resultado in resultados_batch:
-    if not isinstance(resultado, dict):
-        tematicas_finales.append([])
-        continue
-    
-    temas = [
-        label for label, score in zip(resultado['labels'], resultado['scores'])
-        if score > umbral
-    ]
-    
-    # Contar temáticas
-    for tema in temas:
-        if tema in temas_contador:
-            temas_contador[tema] += 1
-    
-    tematicas_finales.append(temas)
-
-# 6. Mostrar estadísticas
-print("\n" + "=" * 60)
-print("ESTADÍSTICAS DE CLASIFICACIÓN:")
-print("=" * 60)
-for tema, count in sorted(temas_contador.items(), key=lambda x: x[1], reverse=True):
-    porcentaje = (count / len(df)) * 100
-    print(f"  {tema:25s}: {count:6d} comentarios ({porcentaje:5.2f}%)")
-
-sin_tematica = sum(1 for t in tematicas_finales if len(t) == 0)
-print(f"\n  Sin temática (< {umbral}):     {sin_tematica:6d} comentarios ({(sin_tematica/len(df))*100:5.2f}%)")
-
-# Mostrar 5 ejemplos finales
-print("\n" + "=" * 60)
-print("EJEMPLOS DE CLASIFICACIÓN:")
-print("=" * 60)
-for i in range(min(5, len(df))):
-    print(f"\n[{i+1}] Texto: '{df.iloc[i][COL_TEXTO][:80]}...'")
-    print(f"    Temáticas: {tematicas_finales[i]}")
-    print(f"    Sentimiento: {df.iloc[i][COL_SENTIMIENTO]}")
-
-# 7. Asignar de vuelta al DataFrame
-df['tematicas'] = tematicas_finales
-df['tematicas'] = df['tematicas'].astype(str)
-
-# 8. Guardar en la DB
-print(f"\n{'='*60}")
-print(f"Guardando resultados en la nueva tabla '{NUEVA_TABLA}'...")
-try:
-    df_final = df[['post_id', 'text', 'sentiment_label', 'tematicas']]
-    df_final.to_sql(NUEVA_TABLA, conn, if_exists='replace', index=False)
-    print(f"✓ ¡Proceso completado exitosamente!")
-    print(f"✓ Tabla '{NUEVA_TABLA}' creada con {len(df_final)} registros")
-except Exception as e:
-    print(f"Error al guardar en la base de datos: {e}")
-finally:
-    conn.close()
-    print(f"\n{'='*60}")
+    marca = load_cursor(conn, *SCORING_CURSOR, SENTIMENT_MODEL)
+    if marca:
+        return int(marca)
+    primero_sin_score = conn.execute("""
+        SELECT MIN(p.rowid) FROM posts AS p
+        WHERE p.text IS NOT NULL AND length(p.text) > 0
+          AND NOT EXISTS (
+            SELECT 1 FROM scores AS s WHERE s.post_id = p.post_id AND s.model_name = ?
+          )
+    """, (SENTIMENT_MODEL,)).fetchone()[0]
+    if primero_sin_score is not None:
+        return primero_sin_score - 1
+    return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM posts").fetchone()[0]
+
+
+def iter_tramos(conn, desde: int, hasta: int):
+    """Tramos de (rowid, post_id, texto, sentimiento) con paginación por clave."""
+    ultimo = desde
+    while True:
+        filas = conn.execute(QUERY_TRAMO, (SENTIMENT_MODEL, ultimo, hasta, TRAMO)).fetchall()
+        if not filas:
+            return
+        ultimo = filas[-1][0]
+        yield filas
+
+
+def main():
+    reiniciar = "--reiniciar" in sys.argv
+
+    print(f"Conectando a {DB_PATH}...")
+    conn = connect()
+    try:
+        ensure_schema(conn)
+        ids = topic_ids(conn, tematicas_candidatas)
+        conn.commit()
+
+        desde = 0 if reiniciar else int(load_cursor(conn, *TOPICS_CURSOR, CLAVE_CACHE) or 0)
+        hasta = limite_superior(conn)
+        pendientes = conn.execute(
+            "SELECT COUNT(*) FROM posts AS p INNER JOIN scores AS s "
+            "ON s.post_id = p.post_id AND s.model_name = ? WHERE p.rowid > ? AND p.rowid <= ?",
+            (SENTIMENT_MODEL, desde, hasta),
+        ).fetchone()[0]
+        if pendientes == 0:
+            print("No hay posts nuevos para clasificar.")
+            return
+        print(f"Pendientes: {pendientes} comentarios (desde rowid {desde}).")
+
+        # 1. Cargar el modelo
+        print(f"Cargando motor de temáticas '{motor.nombre}'...")
+        motor.load()
+        print("Modelo cargado.")
+
+        # 2. Procesar por tramos: clasificar, guardar y confirmar el progreso
+        print("=" * 60)
+        temas_contador = {tema: 0 for tema in tematicas_candidatas}
+        sin_tematica = 0
+        procesados = 0
+        desde_cache = 0
+        ejemplos = []
+        tiempo_inicio = time.time()
+
+        with tqdm(total=pendientes, desc="Clasificando", unit="post", ncols=100) as pbar:
+            for filas in iter_tramos(conn, desde, hasta):
+                textos = [normalize(f[2]) for f in filas]
+                resultados, hits = classify_cached(conn, CLAVE_CACHE, textos, motor.classify)
+
+                # Un score por (post, tema), también los que no pasan el umbral
+                scores_post_tema = [
+                    (fila[1], ids[label], float(score))
+                    for fila, resultado in zip(filas, resultados)
+                    for label, score in zip(resultado['labels'], resultado['scores'])
+                ]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO post_topics (post_id, topic_id, score) VALUES (?,?,?)",
+                    scores_post_tema
+                )
+                save_cursor(conn, *TOPICS_CURSOR, CLAVE_CACHE, filas[-1][0])
+                conn.commit()   # caché + post_topics + progreso en la misma transacción
+                refresh_aggregates(conn, derived=False)   # topic_daily de los días tocados
+
+                # Estadísticas acumuladas (sin guardar los resultados)
+                for fila, resultado in zip(filas, resultados):
+                    temas = [l for l, s in zip(resultado['labels'], resultado['scores']) if s > UMBRAL_TEMAS]
+                    for tema in temas:
+                        temas_contador[tema] += 1
+                    if not temas:
+                        sin_tematica += 1
+                    if len(ejemplos) < 5:
+                        ejemplos.append((fila[2], temas, fila[3]))
+
+                procesados += len(filas)
+                desde_cache += hits
+                pbar.update(len(filas))
+
+        refresh_aggregates(conn)   # event_impact y anomalías, una vez por corrida
+        tiempo_clasificacion = time.time() - tiempo_inicio
+        print(f"\n✓ Procesamiento completado en {tiempo_clasificacion/60:.2f} minutos")
+        print(f"  Velocidad: {procesados/tiempo_clasificacion:.1f} textos/segundo")
+        print(f"  Desde caché: {desde_cache} textos ({desde_cache/procesados:.1%})")
+
+        # 3. Mostrar estadísticas
+        print("\n" + "=" * 60)
+        print(f"ESTADÍSTICAS DE CLASIFICACIÓN (umbral {UMBRAL_TEMAS:.2f}):")
+        print("=" * 60)
+        for tema, count in sorted(temas_contador.items(), key=lambda x: x[1], reverse=True):
+            porcentaje = (count / procesados) * 100
+            print(f"  {tema:25s}: {count:6d} comentarios ({porcentaje:5.2f}%)")
+        print(f"\n  Sin temática (< {UMBRAL_TEMAS}):     {sin_tematica:6d} comentarios ({(sin_tematica/procesados)*100:5.2f}%)")
+
+        print("\n" + "=" * 60)
+        print("EJEMPLOS DE CLASIFICACIÓN:")
+        print("=" * 60)
+        for i, (texto, temas, sentimiento) in enumerate(ejemplos):
+            print(f"\n[{i+1}] Texto: '{(texto or '')[:80]}...'")
+            print(f"    Temáticas: {temas}")
+            print(f"    Sentimiento: {sentimiento}")
+    finally:
+        conn.close()
+        print(f"\n{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# topic_engines.py
+# Motores de clasificación de temáticas para tematicas.py.
+#
+#   zero-shot   facebook/bart-large-mnli con multi_label (una pasada NLI del
+#               modelo grande por comentario y por tema: lo más caro del pipeline)
+#   embeddings  un encoder de oraciones chico embebe cada comentario una vez y se
+#               compara por coseno (NumPy) contra prototipos precalculados de cada
+#               tema; la similitud se lleva a [0, 1] con una sigmoide
+#
+# Ambos devuelven la misma salida ({labels, scores} ordenada de mayor a menor),
+# así el umbral UMBRAL_TEMAS y 'post_topics' se usan igual con cualquiera.
+# check_topic_agreement.py compara los dos motores sobre una muestra.
+
+import os
+
+import numpy as np
+
+from inference_cache import model_key
+
+ENGINES = ("zero-shot", "embeddings")
+
+MODELO_ZS = "facebook/bart-large-mnli"
+MODELO_EMB = os.getenv("TOPIC_EMB_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+
+# Coseno -> score: sigmoide((coseno - CENTRO) * ESCALA). 0.33 y 12 son valores
+# iniciales puestos a mano, no salen de una calibración. check_topic_agreement.py
+# ajusta los dos contra los scores de BART en su muestra y los imprime para
+# fijarlos con TOPIC_EMB_CENTRO / TOPIC_EMB_ESCALA (también al cambiar de encoder).
+EMB_CENTRO = float(os.getenv("TOPIC_EMB_CENTRO", "0.33"))
+EMB_ESCALA = float(os.getenv("TOPIC_EMB_ESCALA", "12"))
+EMB_MAX_LENGTH = 128
+EMB_BATCH = 128
+
+# Frases prototipo por tema (español e inglés, como los comentarios). El
+# prototipo es el promedio normalizado de sus embeddings; un tema sin frases
+# usa su propio nombre.
+PROTOTIPOS = {
+    "Música": [
+        "música", "álbum nuevo", "esta canción es increíble", "el beat y la producción",
+        "music", "new album", "this song slaps", "the beat and production", "Donda", "Graduation",
+    ],
+    "Polémicas": [
+        "polémica", "escándalo", "dijo algo ofensivo", "lo cancelaron",
+        "controversy", "scandal", "antisemitic comments", "he got cancelled", "canceled",
+    ],
+    "Familia": [
+        "familia", "sus hijos", "su madre", "Kim Kardashian y los niños",
+        "family", "his kids", "his mother Donda", "co-parenting with Kim",
+    ],
+    "Religión": [
+        "religión", "Dios", "Jesús", "fe cristiana", "iglesia",
+        "religion", "God", "Jesus is King", "Sunday Service", "faith",
+    ],
+    "Entrevista con Joe Rogan": [
+        "entrevista con Joe Rogan", "podcast de Rogan",
+        "Joe Rogan interview", "Rogan podcast", "JRE episode",
+    ],
+    "Moda / Yeezy": [
+        "moda", "zapatillas Yeezy", "ropa y diseño",
+        "fashion", "Yeezy sneakers", "Adidas deal", "Gap collab", "clothing line",
+    ],
+    "Política": [
+        "política", "elecciones presidenciales", "Trump", "campaña 2020",
+        "politics", "presidential run", "MAGA hat", "2020 election campaign",
+    ],
+}
+
+
+def _top_first(labels, scores):
+    """Etiquetas y scores ordenados de mayor a menor (como el pipeline zero-shot)."""
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    return {'labels': [labels[i] for i in order], 'scores': [float(scores[i]) for i in order]}
+
+
+class ZeroShotEngine:
+    """bart-large-mnli vía pipeline de transformers (el motor original)."""
+
+    nombre = "zero-shot"
+
+    def __init__(self, etiquetas, batch_size=64, device=0):
+        self.etiquetas = list(etiquetas)
+        self.batch_size = batch_size
+        self.device = device
+        self.cache_key = model_key(MODELO_ZS, self.etiquetas, "multi_label")
+        self._clf = None
+
+    def load(self):
+        from transformers import pipeline
+        self._clf = pipeline("zero-shot-classification", model=MODELO_ZS, device=self.device)
+        return self
+
+    def classify(self, textos):
+        salida = self._clf(textos, self.etiquetas, multi_label=True, batch_size=self.batch_size)
+        if isinstance(salida, dict):
+            salida = [salida]
+        return [{'labels': r['labels'], 'scores': r['scores']} for r in salida]
+
+
+class EmbeddingEngine:
+    """Encoder de oraciones + coseno contra prototipos de cada tema."""
+
+    nombre = "embeddings"
+
+    def __init__(self, etiquetas, device=-1):
+        self.etiquetas = list(etiquetas)
+        self.device = "cuda" if device >= 0 else "cpu"
+        frases = [PROTOTIPOS.get(e) or [e] for e in self.etiquetas]
+        self.cache_key = model_key(MODELO_EMB, self.etiquetas, frases, EMB_CENTRO, EMB_ESCALA)
+        self._frases = frases
+        self._prototipos = None
+
+    def load(self):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        self._torch = torch
+        self._tokenizer = AutoTokenizer.from_pretrained(MODELO_EMB)
+        self._model = AutoModel.from_pretrained(MODELO_EMB).eval().to(self.device)
+
+        # Un vector unitario por tema: promedio de sus frases prototipo
+        protos = []
+        for frases in self._frases:
+            v = self.embed(frases).mean(axis=0)
+            protos.append(v / np.linalg.norm(v))
+        self._prototipos = np.stack(protos)          # (temas, dim)
+        return self
+
+    def embed(self, textos) -> np.ndarray:
+        """Embeddings normalizados (mean pooling con máscara), shape (n, dim)."""
+        torch = self._torch
+        out = []
+        for start in range(0, len(textos), EMB_BATCH):
+            enc = self._tokenizer(
+                textos[start:start + EMB_BATCH], padding=True, truncation=True,
+                max_length=EMB_MAX_LENGTH, return_tensors="pt",
+            ).to(self.device)
+            with torch.inference_mode():
+                hidden = self._model(**enc).last_hidden_state
+            mask = enc["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            out.append(torch.nn.functional.normalize(pooled, dim=1).cpu().numpy())
+        return np.concatenate(out) if out else np.zeros((0, self._prototipos.shape[1]), dtype=np.float32)
+
+    def similarities(self, textos) -> np.ndarray:
+        """Coseno de cada texto contra el prototipo de cada tema, shape (n, temas)."""
+        return self.embed(textos) @ self._prototipos.T
+
+    def classify(self, textos):
+        sims = self.similarities(textos)
+        scores = 1.0 / (1.0 + np.exp(-(sims - EMB_CENTRO) * EMB_ESCALA))
+        return [_top_first(self.etiquetas, fila) for fila in scores]
+
+
+def build_engine(nombre: str, etiquetas, **kwargs):
+    """Instancia (sin cargar el modelo) el motor 'zero-shot' o 'embeddings'."""
+    if nombre == "zero-shot":
+        return ZeroShotEngine(etiquetas, **kwargs)
+    if nombre == "embeddings":
+        return EmbeddingEngine(etiquetas, **kwargs)
+    raise ValueError(f"Motor de temáticas desconocido: {nombre!r} (opciones: {', '.join(ENGINES)})")
@@ -0,0 +1,212 @@
+# yt_fake_api.py
+# Servidor HTTP local que imita commentThreads / comments / videos de la
+# YouTube Data API v3 para probar yt_ingest.py sin red ni cuota.
+#
+#   --fixtures DIR   reproduce respuestas grabadas con YT_RECORD_DIR=DIR
+#   (sin --fixtures) genera comentarios sintéticos deterministas por video
+#
+# Puede simular latencia, errores transitorios (503/429) y cuota agotada para
+# ejercitar los reintentos y el corte por cuota del cliente.
+#
+# Uso:
+#   python yt_fake_api.py --puerto 8765 --comentarios 2000 --latencia 0.05
+#   YT_API_BASE=http://127.0.0.1:8765 python yt_ingest.py vid1 vid2 vid3
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from yt_ingest import fixture_name
+
+PAGE_SIZE = 100
+INICIO = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+# ---------- datos sintéticos ----------
+def _ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _snippet(video_id, idx, published, likes, text):
+    return {
+        "videoId": video_id,
+        "textDisplay": text,
+        "authorDisplayName": f"@user{idx % 997}",
+        "authorChannelId": {"value": f"UC{idx % 997:06d}"},
+        "likeCount": likes,
+        "publishedAt": _ts(published),
+        "updatedAt": _ts(published),
+    }
+
+
+class SyntheticData:
+    """
+    'n' hilos por video, listados del más nuevo al más viejo (como order=time).
+    El hilo k (0 = el más viejo, id estable) tiene k % 13 replies, así que
+    algunos superan las 5 incluidas. avanzar() simula el paso del tiempo entre
+    crawls: hilos nuevos, más likes y replies nuevas en un hilo de cada tres.
+    """
+
+    def __init__(self, n_threads: int):
+        self.n = n_threads
+        self.ronda = 0
+
+    def avanzar(self, nuevos: int = 10):
+        self.n += nuevos
+        self.ronda += 1
+
+    def thread_count(self, video_id):
+        return self.n
+
+    def n_replies(self, k):
+        return k % 13 + (self.ronda if k % 3 == 0 else 0)
+
+    def thread(self, video_id, i):
+        k = self.n - 1 - i
+        cid = f"{video_id}.c{k:06d}"
+        published = INICIO + timedelta(minutes=10 * k)
+        n_replies = self.n_replies(k)
+        likes = (k * 7919) % 50 + self.ronda
+        top = {"id": cid, "snippet": _snippet(video_id, k, published, likes, f"comentario {k} del video {video_id}")}
+        item = {
+            "id": cid,
+            "snippet": {"videoId": video_id, "topLevelComment": top, "totalReplyCount": n_replies},
+        }
+        if n_replies:
+            item["replies"] = {"comments": [self.reply(video_id, cid, k, j) for j in range(min(5, n_replies))]}
+        return item
+
+    def reply(self, video_id, parent_id, k, j):
+        published = INICIO + timedelta(minutes=10 * k + j + 1)
+        return {"id": f"{parent_id}.r{j:03d}",
+                "snippet": {**_snippet(video_id, k * 100 + j, published, j, f"respuesta {j} a {parent_id}"),
+                            "parentId": parent_id}}
+
+    def comment_threads(self, q):
+        video_id = q["videoId"]
+        start = int(q.get("pageToken") or 0)
+        size = min(int(q.get("maxResults") or 20), PAGE_SIZE)
+        end = min(start + size, self.thread_count(video_id))
+        page = {"items": [self.thread(video_id, i) for i in range(start, end)]}
+        if end < self.thread_count(video_id):
+            page["nextPageToken"] = str(end)
+        return page
+
+    def comments(self, q):
+        parent_id = q["parentId"]
+        video_id, _, cpart = parent_id.rpartition(".c")
+        k = int(cpart)
+        total = self.n_replies(k)
+        start = int(q.get("pageToken") or 0)
+        size = min(int(q.get("maxResults") or 20), PAGE_SIZE)
+        end = min(start + size, total)
+        page = {"items": [self.reply(video_id, parent_id, k, j) for j in range(start, end)]}
+        if end < total:
+            page["nextPageToken"] = str(end)
+        return page
+
+    def videos(self, q):
+        return {"items": [
+            {"id": v, "snippet": {"channelId": "UCfake", "title": f"Video {v}", "publishedAt": _ts(INICIO)},
+             "statistics": {"viewCount": "1000", "likeCount": "100", "commentCount": str(self.n)}}
+            for v in q["id"].split(",")
+        ]}
+
+
+class Fixtures:
+    """Respuestas grabadas por yt_ingest.py con YT_RECORD_DIR."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def load(self, endpoint, q):
+        path = os.path.join(self.directory, fixture_name(endpoint, q))
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+# ---------- servidor ----------
+def make_handler(source, latency=0.0, fail_rate=0.0, quota=None):
+    lock = threading.Lock()
+    state = {"requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status, reason):
+            self._send(status, {"error": {"code": status, "errors": [{"reason": reason}]}})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+            q = {k: v[0] for k, v in parse_qs(url.query).items() if k != "key"}
+
+            with lock:
+                state["requests"] += 1
+                n = state["requests"]
+            if latency:
+                time.sleep(latency)
+            if quota is not None and n > quota:
+                return self._error(403, "quotaExceeded")
+            if fail_rate and random.random() < fail_rate:
+                return self._error(random.choice((503, 429)), "backendError")
+
+            if isinstance(source, Fixtures):
+                data = source.load(endpoint, q)
+            else:
+                handler = {"commentThreads": source.comment_threads, "comments": source.comments,
+                           "videos": source.videos}.get(endpoint)
+                data = handler(q) if handler else None
+            if data is None:
+                return self._error(404, "notFound")
+            self._send(200, data)
+
+    return Handler
+
+
+def serve(port=8765, source=None, latency=0.0, fail_rate=0.0, quota=None):
+    """Arranca el servidor en un hilo y lo devuelve (server.shutdown() para pararlo)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 make_handler(source or SyntheticData(500), latency, fail_rate, quota))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Imitación local de la YouTube Data API v3")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--fixtures", help="directorio con respuestas grabadas (YT_RECORD_DIR)")
+    parser.add_argument("--comentarios", type=int, default=500, help="hilos sintéticos por video")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por respuesta")
+    parser.add_argument("--fallas", type=float, default=0.0, help="proporción de 503/429 transitorios")
+    parser.add_argument("--cuota", type=int, help="peticiones antes de responder quotaExceeded")
+    args = parser.parse_args()
+
+    source = Fixtures(args.fixtures) if args.fixtures else SyntheticData(args.comentarios)
+    server = serve(args.puerto, source, args.latencia, args.fallas, args.cuota)
+    print(f"API local en http://127.0.0.1:{args.puerto} (Ctrl+C para salir)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+# yt_ingest.py
+# Ingesta masiva de comentarios de YouTube (commentThreads + replies) a
+# 'yt_comments' y normalizados a 'posts'.
+#
+# Las páginas de un video son secuenciales (pageToken), así que el paralelismo
+# está entre videos e hilos de replies: un pool de hilos pide páginas con un
+# limitador de tasa común y reintentos con backoff exponencial; el hilo
+# principal acumula filas y escribe en transacciones grandes (un solo escritor).
+# El tiempo queda acotado por la cuota de la API, no por viajes ni commits.
+#
+# Re-crawl incremental: al terminar un video se guarda en fetch_cursors
+# ('youtube', 'video', video_id) el publishedAt más nuevo visto (la fecha del
+# crawl queda en last_datetime). La siguiente corrida lista los hilos por
+# tiempo (order=time) y deja de paginar al pasar YT_REFRESH_DAYS antes de esa
+# marca: lo más nuevo se inserta y los hilos recientes actualizan like_count /
+# reply_count en lote (upsert); sólo se piden las replies de los hilos cuyo
+# totalReplyCount cambió. Los hilos más viejos que la ventana no se revisan;
+# --completo vuelve a recorrer todo el video.
+#
+# La URL base es configurable: con YT_API_BASE apuntando a yt_fake_api.py se
+# corre contra fixtures grabados (YT_RECORD_DIR guarda cada respuesta real) o
+# contra datos sintéticos, sin gastar cuota.
+#
+# Uso:
+#   YOUTUBE_API_KEY=... python yt_ingest.py VIDEO_ID [VIDEO_ID ...]
+#   YOUTUBE_API_KEY=... python yt_ingest.py --videos videos.txt
+#   YOUTUBE_API_KEY=... python yt_ingest.py --completo VIDEO_ID   # ignora la marca
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import requests
+
+import aggregates
+from pipeline_db import DB_PATH, connect, ensure_schema, load_cursor, save_cursor
+
+API_BASE = os.getenv("YT_API_BASE", "https://www.googleapis.com/youtube/v3")
+API_KEY = os.getenv("YOUTUBE_API_KEY", "")
+WORKERS = int(os.getenv("INGEST_WORKERS", "8"))              # peticiones en vuelo
+MAX_QPS = float(os.getenv("INGEST_QPS", "10"))              # peticiones por segundo (todas)
+COMMIT_ROWS = int(os.getenv("INGEST_COMMIT_ROWS", "5000"))  # comentarios por transacción
+RECORD_DIR = os.getenv("YT_RECORD_DIR")                     # graba respuestas como fixtures
+REFRESH_DAYS = float(os.getenv("YT_REFRESH_DAYS", "7"))     # hilos recientes a re-revisar
+MAX_RETRIES = 6
+TIMEOUT = 30
+
+POST_ID_PREFIX = "yt_"      # posts.post_id = prefijo + comment_id (único entre fuentes)
+WATERMARK = ("youtube", "video")    # (source, entity_type) en fetch_cursors; entity_id = video_id
+TS_FORMAT = "%Y-%m-%dT%H:%M:%SZ"    # publishedAt de la API
+QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}            # cuota del día: parar
+RETRY_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}     # ráfaga: reintentar
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class QuotaExceeded(Exception):
+    """La API rechazó la petición por cuota: no tiene sentido seguir pidiendo."""
+
+
+class ApiError(Exception):
+    """Error no recuperable de una petición (video sin comentarios, 404, ...)."""
+
+
+def fixture_name(endpoint: str, params: dict) -> str:
+    """Nombre de archivo de una respuesta grabada (mismo criterio en yt_fake_api.py)."""
+    ident = params.get("videoId") or params.get("parentId") or params.get("id") or "x"
+    ident = ident.replace(",", "+")
+    return f"{endpoint}__{ident}__{params.get('pageToken') or 'first'}.json"
+
+
+class RateLimiter:
+    """Token bucket compartido por los hilos: como máximo 'rate' peticiones/s."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_s = (1 - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class YouTubeAPI:
+    """Cliente HTTP mínimo de la Data API v3 (thread-safe: una sesión por hilo)."""
+
+    def __init__(self, base=API_BASE, key=API_KEY, qps=MAX_QPS, record_dir=RECORD_DIR):
+        self.base = base.rstrip("/")
+        self.key = key
+        self.limiter = RateLimiter(qps, burst=max(1, int(qps)))
+        self.record_dir = record_dir
+        self.local = threading.local()
+        self.requests = 0          # ~ unidades de cuota gastadas (1 por página)
+        self.retries = 0
+        self._count_lock = threading.Lock()
+
+    def _session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def get(self, endpoint: str, **params) -> dict:
+        params = {k: v for k, v in params.items() if v is not None}
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire()
+            with self._count_lock:
+                self.requests += 1
+            try:
+                resp = self._session().get(f"{self.base}/{endpoint}",
+                                           params={**params, "key": self.key}, timeout=TIMEOUT)
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if resp.status_code == 200:
+                    data = resp.json()
+                    if self.record_dir:
+                        with open(os.path.join(self.record_dir, fixture_name(endpoint, params)), "w", encoding="utf-8") as f:
+                            json.dump(data, f, ensure_ascii=False)
+                    return data
+                reasons = {e.get("reason") for e in _error_details(resp)}
+                if resp.status_code == 403 and reasons & QUOTA_REASONS:
+                    raise QuotaExceeded(f"{endpoint}: {', '.join(sorted(r for r in reasons if r))}")
+                if resp.status_code not in RETRY_STATUS and not reasons & RETRY_REASONS:
+                    raise ApiError(f"{endpoint} {params}: HTTP {resp.status_code} {sorted(r for r in reasons if r)}")
+                error = f"HTTP {resp.status_code}"
+
+            if attempt == MAX_RETRIES:
+                raise ApiError(f"{endpoint} {params}: {error} tras {MAX_RETRIES} reintentos")
+            with self._count_lock:
+                self.retries += 1
+            time.sleep(min(60, 2 ** attempt) * (0.5 + random.random()))   # backoff con jitter
+
+
+def _error_details(resp):
+    try:
+        return resp.json().get("error", {}).get("errors", []) or []
+    except ValueError:
+        return []
+
+
+# ---------- filas ----------
+def comment_row(video_id: str, comment_id: str, snip: dict, parent_id=None):
+    """Fila de 'yt_comments'."""
+    return (
+        comment_id,
+        video_id,
+        parent_id,
+        snip.get("authorChannelId", {}).get("value"),
+        snip.get("authorDisplayName"),
+        snip.get("textDisplay"),
+        snip.get("likeCount"),
+        snip.get("publishedAt"),
+        f"https://www.youtube.com/watch?v={video_id}&lc={comment_id}",
+        None,
+    )
+
+
+def post_row(c, reply_count=None):
+    """Fila de 'posts' a partir de una fila de 'yt_comments'."""
+    comment_id, video_id, parent_id, _, author, text, likes, published, url, _ = c
+    return (
+        POST_ID_PREFIX + comment_id, video_id,
+        POST_ID_PREFIX + parent_id if parent_id else None,
+        published, author, text, likes, reply_count, url,
+    )
+
+
+class Batch:
+    """Resultado de una tarea: filas para la DB y tareas siguientes."""
+
+    def __init__(self, video_id=None):
+        self.video_id = video_id
+        self.comments, self.posts, self.videos, self.follow = [], [], [], []
+        self.next_page = None
+        self.newest = None         # publishedAt del hilo más nuevo de la página
+
+
+# ---------- marca por video ----------
+def refresh_from(watermark: str) -> str:
+    """Límite de la ventana de refresco: REFRESH_DAYS antes de la marca."""
+    ts = datetime.strptime(watermark, TS_FORMAT) - timedelta(days=REFRESH_DAYS)
+    return ts.strftime(TS_FORMAT)
+
+
+def crawl_plan(conn, video_id: str, full=False):
+    """
+    (marca, stop_before, known) de un video. Sin marca (o con full) es un crawl
+    completo: (None, None, None). 'known' mapea comment_id -> reply_count de los
+    hilos ya guardados del video (la última página pasa el límite de la ventana).
+    """
+    watermark = None if full else load_cursor(conn, *WATERMARK, video_id)
+    if watermark is None:
+        return None, None, None
+    stop_before = refresh_from(watermark)
+    known = dict(conn.execute("""
+      SELECT c.comment_id, p.reply_count
+      FROM yt_comments AS c
+      INNER JOIN posts AS p ON p.post_id = ? || c.comment_id
+      WHERE c.video_id = ? AND c.parent_id IS NULL
+    """, (POST_ID_PREFIX, video_id)))
+    return watermark, stop_before, known
+
+
+# ---------- tareas (corren en el pool) ----------
+def fetch_videos(api, video_ids):
+    """Metadatos de hasta 50 videos (1 unidad de cuota)."""
+    data = api.get("videos", part="snippet,statistics", id=",".join(video_ids), maxResults=50)
+    out = Batch()
+    for it in data.get("items", []):
+        sn, st = it.get("snippet", {}), it.get("statistics", {})
+        out.videos.append((
+            it["id"], sn.get("channelId"), sn.get("title"), sn.get("publishedAt"),
+            _int(st.get("viewCount")), _int(st.get("likeCount")), _int(st.get("commentCount")),
+            f"https://www.youtube.com/watch?v={it['id']}", None,
+        ))
+    return out
+
+
+def fetch_thread_page(api, video_id, page_token=None, order=None, stop_before=None, known=None):
+    """
+    Una página de commentThreads (100 hilos con hasta 5 replies incluidas).
+    Con 'stop_before' (y order=time) no sigue paginando cuando la página ya
+    llega a hilos anteriores a esa fecha; los hilos en 'known' sólo piden sus
+    replies si cambió totalReplyCount.
+    """
+    data = api.get("commentThreads", part="snippet,replies", videoId=video_id, maxResults=100,
+                   pageToken=page_token, order=order, textFormat="plainText")
+    out = Batch(video_id)
+    oldest = None
+    for it in data.get("items", []):
+        thread = it["snippet"]
+        top = thread["topLevelComment"]
+        total_replies = thread.get("totalReplyCount", 0)
+        c = comment_row(video_id, top["id"], top["snippet"])
+        out.comments.append(c)
+        out.posts.append(post_row(c, total_replies))
+        published = top["snippet"].get("publishedAt")
+        if published:
+            oldest = min(oldest or published, published)
+            out.newest = max(out.newest or published, published)
+
+        included = it.get("replies", {}).get("comments", [])
+        if total_replies > len(included):
+            if known is None or known.get(top["id"]) != total_replies:
+                out.follow.append((fetch_replies_page, (api, video_id, top["id"], None)))
+        else:
+            for r in included:
+                rc = comment_row(video_id, r["id"], r["snippet"], top["id"])
+                out.comments.append(rc)
+                out.posts.append(post_row(rc))
+
+    out.next_page = data.get("nextPageToken")
+    if stop_before and oldest and oldest < stop_before:
+        out.next_page = None        # el resto ya está en la DB y fuera de la ventana
+    if out.next_page:
+        out.follow.append((fetch_thread_page, (api, video_id, out.next_page, order, stop_before, known)))
+    return out
+
+
+def fetch_replies_page(api, video_id, parent_id, page_token=None):
+    """Una página de replies de un hilo (comments.list con parentId)."""
+    data = api.get("comments", part="snippet", parentId=parent_id, maxResults=100,
+                   pageToken=page_token, textFormat="plainText")
+    out = Batch(video_id)
+    for r in data.get("items", []):
+        rc = comment_row(video_id, r["id"], r["snippet"], parent_id)
+        out.comments.append(rc)
+        out.posts.append(post_row(rc))
+    if data.get("nextPageToken"):
+        out.follow.append((fetch_replies_page, (api, video_id, parent_id, data["nextPageToken"])))
+    return out
+
+
+def _int(v):
+    return int(v) if v is not None else None
+
+
+# ---------- escritura (hilo principal) ----------
+# Los comentarios ya guardados sólo actualizan sus contadores (y sólo si cambiaron,
+# así el trigger de posts no marca días sucios de más).
+UPSERT_COMMENTS = """
+  INSERT INTO yt_comments
+  (comment_id, video_id, parent_id, author_id, author_name, text, like_count, published_at, url, extra_json)
+  VALUES (?,?,?,?,?,?,?,?,?,?)
+  ON CONFLICT (comment_id) DO UPDATE SET like_count = excluded.like_count
+  WHERE yt_comments.like_count IS NOT excluded.like_count
+"""
+UPSERT_POSTS = """
+  INSERT INTO posts
+  (post_id, source, root_id, parent_id, created_at, author, text, like_count, reply_count, score, url, extra_json)
+  VALUES (?, 'youtube', ?, ?, ?, ?, ?, ?, ?, NULL, ?, NULL)
+  ON CONFLICT (post_id) DO UPDATE SET
+    like_count = excluded.like_count,
+    reply_count = COALESCE(excluded.reply_count, posts.reply_count)
+  WHERE posts.like_count IS NOT excluded.like_count
+     OR posts.reply_count IS NOT COALESCE(excluded.reply_count, posts.reply_count)
+"""
+UPSERT_VIDEOS = """
+  INSERT INTO yt_videos
+  (video_id, channel_id, title, published_at, view_count, like_count, comment_count, url, extra_json)
+  VALUES (?,?,?,?,?,?,?,?,?)
+  ON CONFLICT (video_id) DO UPDATE SET
+    title = excluded.title, view_count = excluded.view_count,
+    like_count = excluded.like_count, comment_count = excluded.comment_count
+"""
+
+
+class Writer:
+    """
+    Acumula filas y las escribe en una transacción cada COMMIT_ROWS comentarios.
+    Las marcas de los videos terminados van en la misma transacción que sus
+    últimas filas.
+    """
+
+    def __init__(self, conn, commit_rows=COMMIT_ROWS):
+        self.conn = conn
+        self.commit_rows = commit_rows
+        self.comments, self.posts, self.videos, self.cursors = [], [], [], []
+        self.written = 0
+
+    def add(self, batch: Batch):
+        self.comments += batch.comments
+        self.posts += batch.posts
+        self.videos += batch.videos
+        if len(self.comments) >= self.commit_rows:
+            self.flush()
+
+    def done(self, video_id: str, watermark: str):
+        self.cursors.append((video_id, watermark))
+
+    def flush(self):
+        if not (self.comments or self.videos or self.cursors):
+            return
+        with self.conn:
+            self.conn.executemany(UPSERT_VIDEOS, self.videos)
+            self.conn.executemany(UPSERT_COMMENTS, self.comments)
+            self.conn.executemany(UPSERT_POSTS, self.posts)
+            for video_id, watermark in self.cursors:
+                save_cursor(self.conn, *WATERMARK, video_id, watermark)
+        self.written += len(self.comments)
+        self.comments, self.posts, self.videos, self.cursors = [], [], [], []
+
+
+def ingest(conn, api, video_ids, workers=WORKERS, full=False, on_done=None):
+    """
+    Descarga los hilos (y replies) de 'video_ids' y los escribe en la DB: completo
+    la primera vez (o con full), incremental para los videos con marca.
+    'on_done(batch)' se llama en el hilo principal por cada tarea terminada.
+    Devuelve un dict de estadísticas.
+    """
+    writer = Writer(conn)
+    errors = []
+    pending = {}                 # future -> video_id (None para metadatos)
+    inflight = Counter()         # tareas sin terminar por video
+    newest, failed = {}, set()
+    incremental = 0
+    t0 = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit(fn, args, video_id=None):
+            pending[pool.submit(fn, *args)] = video_id
+            if video_id:
+                inflight[video_id] += 1
+
+        for start in range(0, len(video_ids), 50):
+            submit(fetch_videos, (api, video_ids[start:start + 50]))
+        for vid in video_ids:
+            watermark, stop_before, known = crawl_plan(conn, vid, full)
+            if watermark:
+                newest[vid] = watermark
+                incremental += 1
+            submit(fetch_thread_page, (api, vid, None, "time", stop_before, known), vid)
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    vid = pending.pop(fut)
+                    try:
+                        batch = fut.result()
+                    except ApiError as e:
+                        errors.append(str(e))      # se salta ese video/hilo, el resto sigue
+                        failed.add(vid)
+                    else:
+                        writer.add(batch)
+                        if on_done:
+                            on_done(batch)
+                        if batch.newest:
+                            newest[vid] = max(newest.get(vid, batch.newest), batch.newest)
+                        for fn, args in batch.follow:
+                            submit(fn, args, vid)
+                    if vid:
+                        inflight[vid] -= 1
+                        if not inflight[vid] and vid not in failed and vid in newest:
+                            writer.done(vid, newest[vid])   # video completo: nueva marca
+        except QuotaExceeded:
+            for fut in pending:
+                fut.cancel()
+            raise
+        finally:
+            writer.flush()       # lo descargado hasta acá queda guardado
+
+    return {
+        "comentarios": writer.written,
+        "incrementales": incremental,
+        "peticiones": api.requests,
+        "reintentos": api.retries,
+        "errores": errors,
+        "segundos": time.perf_counter() - t0,
+    }
+
+
+def read_video_ids(args) -> list:
+    ids = list(args.video_ids)
+    if args.videos:
+        with open(args.videos, encoding="utf-8") as f:
+            ids += [line.split("#")[0].strip() for line in f]
+    return list(dict.fromkeys(i for i in ids if i))
+
+
+def main(argv=None):
+    """CLI: esquema, ingesta y refresco de agregados (también con la cuota agotada)."""
+    parser = argparse.ArgumentParser(description="Ingesta de comentarios de YouTube a la DB")
+    parser.add_argument("video_ids", nargs="*", help="IDs de video")
+    parser.add_argument("--videos", help="archivo con un ID de video por línea")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--completo", action="store_true",
+                        help="recorre todos los hilos aunque el video ya tenga marca")
+    args = parser.parse_args(argv)
+
+    video_ids = read_video_ids(args)
+    if not video_ids:
+        parser.error("indica al menos un video")
+    if not API_KEY and API_BASE.startswith("https://www.googleapis.com"):
+        sys.exit("Falta YOUTUBE_API_KEY")
+
+    print(f"Ingesta de {len(video_ids)} videos desde {API_BASE} -> {DB_PATH}")
+    conn = connect()
+    try:
+        ensure_schema(conn)          # triggers que marcan días sucios al cambiar likes/replies
+        stats = ingest(conn, YouTubeAPI(), video_ids, workers=args.workers, full=args.completo)
+        aggregates.refresh(conn)
+    except QuotaExceeded as e:
+        aggregates.refresh(conn)
+        print(f"⚠️  Cuota agotada ({e}); lo descargado quedó guardado.")
+        sys.exit(2)
+    finally:
+        conn.close()
+
+    print(f"✓ {stats['comentarios']} comentarios en {stats['segundos']:.1f}s "
+          f"({stats['incrementales']} videos incrementales, "
+          f"{stats['peticiones']} peticiones, {stats['reintentos']} reintentos)")
+    for e in stats["errores"]:
+        print(f"  ✗ {e}")
+
+
+if __name__ == "__main__":
+    main()